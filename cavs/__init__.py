@@ -1,4 +1,19 @@
-from .cav import compute_cav  # noqa
+from .activation_cache import ActivationCache  # noqa
+from .activation_store import ActivationStore, ActivationStoreWriter, NpzActivations  # noqa
+from .sketch import RandomProjectionSketch, StreamingPCASketch  # noqa
+from .cav import compute_cav, compute_cavs  # noqa
+from .cav_statistics import CAVStatistics  # noqa
+from .dual_cav import compute_cav_dual  # noqa
 from .extract_activations import extract_activations  # noqa
-from .mass_mean_probe import compute_mass_mean_probe  # noqa
-from .tcav import get_tcav_scores  # noqa
+from .gradient_store import save_activation_gradients, score_stored_gradients  # noqa
+from .layer_cavs import fit_cav, fit_layer_cavs  # noqa
+from .mass_mean_probe import StreamingMassMeanProbe, compute_mass_mean_probe  # noqa
+from .profiling import Profiler, profiled, span  # noqa
+from .significance import tcav_significance  # noqa
+from .tcav import (  # noqa
+    collect_activation_gradients,
+    get_multiclass_tcav_scores,
+    get_sequential_tcav_scores,
+    get_tcav_scores,
+    get_tcav_scores_from_activations,
+)
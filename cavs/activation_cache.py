@@ -0,0 +1,325 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import time
+from functools import partial
+
+import numpy as np
+import torch
+from torch import nn
+
+from .activation_store import is_activation_store
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+CACHE_MANIFEST_NAME = "cache_manifest.json"
+
+
+def _update_with_value(h, value) -> None:
+    """
+    Feed a (possibly nested) dataset item or config value into a hash.
+    """
+    if isinstance(value, torch.Tensor):
+        value = value.detach().cpu()
+        h.update(f"tensor:{value.dtype}:{tuple(value.shape)}".encode())
+        h.update(value.contiguous().reshape(-1).view(torch.uint8).numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(f"array:{value.dtype}:{value.shape}".encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(f"seq:{len(value)}".encode())
+        for v in value:
+            _update_with_value(h, v)
+    elif isinstance(value, dict):
+        h.update(f"dict:{len(value)}".encode())
+        for k in sorted(value, key=str):
+            h.update(str(k).encode())
+            _update_with_value(h, value[k])
+    elif hasattr(value, "__array__"):
+        # e.g. PIL images
+        _update_with_value(h, np.asarray(value))
+    else:
+        h.update(repr(value).encode())
+
+
+def describe_callable(value) -> object:
+    """
+    Stable, JSON-serialisable description of a reducer or config value.
+
+    Unlike ``repr``, functions are described by their qualified name rather than
+    their memory address, so descriptions are reproducible across processes.
+    """
+    if value is None:
+        return None
+    if isinstance(value, partial):
+        return {
+            "func": describe_callable(value.func),
+            "args": [describe_callable(a) for a in value.args],
+            "keywords": {
+                k: describe_callable(v) for k, v in sorted(value.keywords.items())
+            },
+        }
+    if isinstance(value, (list, tuple)):
+        return [describe_callable(v) for v in value]
+    if callable(value):
+        name = getattr(value, "__qualname__", type(value).__qualname__)
+        return f"{getattr(value, '__module__', '')}.{name}"
+    return repr(value)
+
+
+def model_fingerprint(model: nn.Module) -> str:
+    """
+    Hash the architecture and all weights and buffers of a model.
+
+    Args:
+        model (nn.Module): The PyTorch model.
+
+    Returns:
+        str: Hex digest identifying the model state.
+    """
+    h = hashlib.sha256()
+    h.update(type(model).__qualname__.encode())
+    for name, tensor in model.state_dict().items():
+        h.update(name.encode())
+        _update_with_value(h, tensor)
+    return h.hexdigest()
+
+
+def dataset_fingerprint(dataset, num_items: int = 8) -> str | None:
+    """
+    Hash the length of a dataset and a fixed, evenly spaced sample of its items.
+
+    Datasets with random augmentations yield different items on every access and
+    therefore never produce a cache hit, which is the safe behaviour.
+
+    Args:
+        dataset (Dataset): Map-style dataset.
+        num_items (int): Number of items to hash.
+
+    Returns:
+        str or None: Hex digest, or None if the dataset has no length or cannot be indexed.
+    """
+    try:
+        length = len(dataset)
+    except TypeError:
+        return None
+
+    h = hashlib.sha256()
+    h.update(f"{type(dataset).__qualname__}:{length}".encode())
+    if length > 0:
+        for idx in np.unique(np.linspace(0, length - 1, num_items).astype(int)):
+            try:
+                item = dataset[int(idx)]
+            except (TypeError, NotImplementedError):
+                return None
+            _update_with_value(h, item)
+    return h.hexdigest()
+
+
+def activation_cache_key(
+    model: nn.Module, dataset, layer_names, layer_reducers: dict, **config
+) -> str | None:
+    """
+    Content address of an extraction: model weights, hooked layers, reducers and dataset.
+
+    Args:
+        model (nn.Module): The PyTorch model.
+        dataset (Dataset): Dataset the activations are extracted from.
+        layer_names (iterable): Names of the hooked layers.
+        layer_reducers (dict): Dictionary mapping layer names to reducers (or None).
+        **config: Further JSON-serialisable settings that change the stored values.
+
+    Returns:
+        str or None: Hex digest, or None if the dataset cannot be fingerprinted.
+    """
+    data_fp = dataset_fingerprint(dataset)
+    if data_fp is None:
+        return None
+
+    description = {
+        "model": model_fingerprint(model),
+        "dataset": data_fp,
+        "layers": sorted(layer_names),
+        "reducers": {
+            name: describe_callable(reducer)
+            for name, reducer in sorted(layer_reducers.items())
+        },
+        "config": config,
+    }
+    return hashlib.sha256(
+        json.dumps(description, sort_keys=True, default=repr).encode()
+    ).hexdigest()
+
+
+def _path_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, f))
+            for root, _, files in os.walk(path)
+            for f in files
+        )
+    return os.path.getsize(path)
+
+
+class ActivationCache:
+    """
+    Content-addressed cache of extracted activations with LRU eviction.
+
+    Entries are keyed by ``activation_cache_key`` and recorded in a JSON manifest in
+    the cache directory, together with their size, last access time and cumulative
+    hit/miss/eviction counters. When ``max_bytes`` is set, least recently used entries
+    are deleted after adding a new one until the cache fits the budget. Updates of the
+    manifest hold a file lock, so concurrent extractions do not lose entries.
+
+    Args:
+        cache_dir (str): Directory holding the cached activations and the manifest.
+        max_bytes (int, optional): Size budget of the cache. None means unbounded.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int | None = None) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.manifest_path = os.path.join(cache_dir, CACHE_MANIFEST_NAME)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """
+        Hold an exclusive lock on the manifest for a read-modify-write.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(self.manifest_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {"entries": {}, "stats": {"hits": 0, "misses": 0, "evictions": 0}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: dict) -> None:
+        # Write atomically so concurrent readers never see a truncated manifest
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def entry_path(self, key: str, experiment_name: str, streaming: bool) -> str:
+        """
+        Path a new entry should be written to.
+        """
+        name = f"{experiment_name}-{key[:16]}"
+        return os.path.join(self.cache_dir, name if streaming else name + ".npz")
+
+    def lookup(self, key: str) -> str | None:
+        """
+        Return the path of a cached entry and mark it as recently used.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            str or None: Path to the cached activations, or None on a miss.
+        """
+        with self._locked():
+            manifest = self._read_manifest()
+            entry = manifest["entries"].get(key)
+            path = entry and os.path.join(self.cache_dir, entry["path"])
+
+            if path is not None and (os.path.isfile(path) or is_activation_store(path)):
+                entry["last_access"] = time.time()
+                entry["hits"] = entry.get("hits", 0) + 1
+                manifest["stats"]["hits"] += 1
+            else:
+                # Drop entries whose files were removed behind our back
+                manifest["entries"].pop(key, None)
+                manifest["stats"]["misses"] += 1
+                path = None
+
+            self._write_manifest(manifest)
+        return path
+
+    def add(self, key: str, path: str, experiment_name: str) -> None:
+        """
+        Record a freshly written entry and evict old ones if over budget.
+
+        Args:
+            key (str): Cache key.
+            path (str): Path the activations were written to.
+            experiment_name (str): Name of the experiment that created the entry.
+        """
+        rel_path = os.path.relpath(path, self.cache_dir)
+        with self._locked():
+            manifest = self._read_manifest()
+
+            # A previous extraction of the same content written elsewhere (another
+            # experiment name or storage mode) may still be in use, so it is kept
+            # under its path and left to LRU eviction instead of being deleted
+            entries = manifest["entries"]
+            previous = entries.get(key)
+            if previous is not None and previous["path"] != rel_path:
+                entries[f"{key}:{previous['path']}"] = previous
+            # The new entry supersedes any older record of the same path
+            for other in [k for k, e in entries.items() if e["path"] == rel_path]:
+                entries.pop(other)
+
+            now = time.time()
+            entries[key] = {
+                "path": rel_path,
+                "experiment_name": experiment_name,
+                "bytes": _path_size(path),
+                "created": now,
+                "last_access": now,
+                "hits": 0,
+            }
+            self._evict(manifest, keep=key)
+            self._write_manifest(manifest)
+
+    def _remove_path(self, rel_path: str) -> None:
+        path = os.path.join(self.cache_dir, rel_path)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def _evict(self, manifest: dict, keep: str) -> None:
+        if self.max_bytes is None:
+            return
+
+        entries = manifest["entries"]
+        total = sum(entry["bytes"] for entry in entries.values())
+        for key in sorted(entries, key=lambda k: entries[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+
+            entry = entries.pop(key)
+            self._remove_path(entry["path"])
+            total -= entry["bytes"]
+            manifest["stats"]["evictions"] += 1
+
+    def stats(self) -> dict:
+        """
+        Cumulative statistics of the cache.
+
+        Returns:
+            dict: Hits, misses, evictions, number of entries and total size in bytes.
+        """
+        manifest = self._read_manifest()
+        return {
+            **manifest["stats"],
+            "entries": len(manifest["entries"]),
+            "bytes": sum(entry["bytes"] for entry in manifest["entries"].values()),
+        }
@@ -0,0 +1,454 @@
+import json
+import os
+import struct
+import zipfile
+from collections.abc import Mapping
+
+import numpy as np
+
+from .quantization import OFFSET_SUFFIX, SCALE_SUFFIX, dequantize
+from .sketch import Sketch, load_sketch
+
+MANIFEST_NAME = "manifest.json"
+# Member of an .npz archive describing its reduced-precision layers
+QUANTIZATION_KEY = "__quantization__"
+
+
+def is_activation_store(path: str) -> bool:
+    """
+    Check whether a path points to a completely written activation store.
+
+    Args:
+        path (str): Path to check.
+
+    Returns:
+        bool: True if the path is a directory containing a store manifest.
+    """
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+class ActivationStoreWriter:
+    """
+    Write activations to disk in fixed-size, per-layer shards as batches arrive.
+
+    Every layer gets its own directory of pre-sized, memory-mapped ``.npy`` shards
+    holding ``shard_size`` samples each. Rows are copied into the current shard as
+    soon as they are appended, so only the batch in flight has to be kept in memory.
+    The manifest describing the shards is written by ``close``; a store without a
+    manifest is considered incomplete.
+
+    Args:
+        store_dir (str): Directory to write the store to.
+        shard_size (int): Number of samples per shard file.
+        num_samples (int, optional): Expected number of samples per layer. If given,
+                                     the last shard is sized to fit instead of
+                                     preallocating a full ``shard_size``.
+    """
+
+    def __init__(
+        self, store_dir: str, shard_size: int = 4096, num_samples: int | None = None
+    ) -> None:
+        if shard_size <= 0:
+            raise ValueError("shard_size must be a positive integer")
+
+        self.store_dir = store_dir
+        self.shard_size = shard_size
+        self.num_samples = num_samples
+        self.layers = {}
+
+        os.makedirs(store_dir, exist_ok=True)
+
+        # Invalidate a previously written store until this one is closed
+        manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+
+    def _open_shard(self, name: str, layer: dict) -> None:
+        layer_dir = os.path.join(self.store_dir, name)
+        os.makedirs(layer_dir, exist_ok=True)
+
+        rows = self.shard_size
+        written = sum(shard["rows"] for shard in layer["shards"])
+        if self.num_samples is not None and written < self.num_samples:
+            rows = min(rows, self.num_samples - written)
+
+        file_name = f"{len(layer['shards']):05d}.npy"
+        layer["memmap"] = np.lib.format.open_memmap(
+            os.path.join(layer_dir, file_name),
+            mode="w+",
+            dtype=layer["dtype"],
+            shape=(rows, *layer["shape"]),
+        )
+        layer["shards"].append({"file": os.path.join(name, file_name), "rows": 0})
+
+    def _close_shard(self, layer: dict) -> None:
+        if layer["memmap"] is not None:
+            layer["memmap"].flush()
+            layer["memmap"] = None
+
+    def append(self, name: str, array: np.ndarray) -> None:
+        """
+        Append a batch of samples to a layer.
+
+        Args:
+            name (str): Layer name.
+            array (np.ndarray): Batch of shape (batch_size, ...).
+        """
+        array = np.asarray(array)
+        layer = self.layers.get(name)
+        if layer is None:
+            layer = {
+                "shape": array.shape[1:],
+                "dtype": array.dtype,
+                "shards": [],
+                "memmap": None,
+            }
+            self.layers[name] = layer
+        elif array.shape[1:] != layer["shape"]:
+            raise ValueError(
+                f"Shape mismatch for layer '{name}': expected samples of shape "
+                f"{layer['shape']}, got {array.shape[1:]}"
+            )
+
+        start = 0
+        while start < len(array):
+            if layer["memmap"] is None:
+                self._open_shard(name, layer)
+
+            shard = layer["shards"][-1]
+            capacity = layer["memmap"].shape[0]
+            n = min(len(array) - start, capacity - shard["rows"])
+            layer["memmap"][shard["rows"] : shard["rows"] + n] = array[start : start + n]
+            shard["rows"] += n
+            start += n
+
+            if shard["rows"] == capacity:
+                self._close_shard(layer)
+
+    def flush(self) -> None:
+        """
+        Flush all open shards to disk.
+        """
+        for layer in self.layers.values():
+            if layer["memmap"] is not None:
+                layer["memmap"].flush()
+
+    def state(self) -> dict:
+        """
+        JSON-serialisable description of everything appended so far.
+
+        Together with ``resume`` this allows continuing an interrupted store. Call
+        ``flush`` first so that the described rows are actually on disk.
+        """
+        return {
+            name: {
+                "shape": list(layer["shape"]),
+                "dtype": np.dtype(layer["dtype"]).str,
+                "shards": [dict(shard) for shard in layer["shards"]],
+            }
+            for name, layer in self.layers.items()
+        }
+
+    @classmethod
+    def resume(
+        cls,
+        store_dir: str,
+        state: dict,
+        shard_size: int = 4096,
+        num_samples: int | None = None,
+    ) -> "ActivationStoreWriter":
+        """
+        Reopen a partially written store at the point described by ``state``.
+
+        Rows written after ``state`` was taken are overwritten by subsequent appends.
+        """
+        writer = cls(store_dir, shard_size, num_samples)
+        for name, layer_state in state.items():
+            layer = {
+                "shape": tuple(layer_state["shape"]),
+                "dtype": np.dtype(layer_state["dtype"]),
+                "shards": [dict(shard) for shard in layer_state["shards"]],
+                "memmap": None,
+            }
+            if layer["shards"]:
+                shard = layer["shards"][-1]
+                memmap = np.load(
+                    os.path.join(store_dir, shard["file"]), mmap_mode="r+"
+                )
+                if shard["rows"] < memmap.shape[0]:
+                    layer["memmap"] = memmap
+            writer.layers[name] = layer
+        return writer
+
+    def close(self, extra: dict | None = None) -> None:
+        """
+        Flush all open shards and write the manifest.
+
+        Args:
+            extra (dict, optional): Additional JSON-serialisable entries for the manifest.
+        """
+        manifest = {"shard_size": self.shard_size, "layers": {}, **(extra or {})}
+        for name, layer in self.layers.items():
+            self._close_shard(layer)
+            manifest["layers"][name] = {
+                "shape": list(layer["shape"]),
+                "dtype": np.dtype(layer["dtype"]).str,
+                "num_samples": sum(shard["rows"] for shard in layer["shards"]),
+                "shards": layer["shards"],
+            }
+
+        with open(os.path.join(self.store_dir, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+
+def merge_stores(store_dir: str, part_dirs: list[str], extra: dict | None = None) -> None:
+    """
+    Stitch several complete stores into one without copying any shard.
+
+    The manifest written to ``store_dir`` lists the shards of every part in the given
+    order, so samples appear in the order of ``part_dirs``.
+
+    Args:
+        store_dir (str): Directory of the merged store; must contain the parts.
+        part_dirs (list): Directories of the stores to merge, in sample order.
+        extra (dict, optional): Additional JSON-serialisable entries for the manifest.
+    """
+    layers = {}
+    sketches = {}
+    quantization = {}
+    shard_size = None
+    for part_dir in part_dirs:
+        with open(os.path.join(part_dir, MANIFEST_NAME)) as f:
+            part = json.load(f)
+        shard_size = shard_size or part["shard_size"]
+        prefix = os.path.relpath(part_dir, store_dir)
+
+        # Only configuration-determined sketches can be merged, so any part's basis will do
+        for name, sketch in part.get("sketches", {}).items():
+            sketches.setdefault(
+                name, {**sketch, "file": os.path.join(prefix, sketch["file"])}
+            )
+
+        # Report the worst reconstruction error over all parts
+        for name, entry in part.get("quantization", {}).items():
+            merged = quantization.setdefault(name, dict(entry))
+            merged["relative_error"] = max(
+                merged["relative_error"], entry["relative_error"]
+            )
+
+        for name, layer in part["layers"].items():
+            merged = layers.setdefault(
+                name,
+                {
+                    "shape": layer["shape"],
+                    "dtype": layer["dtype"],
+                    "num_samples": 0,
+                    "shards": [],
+                },
+            )
+            if merged["shape"] != layer["shape"]:
+                raise ValueError(
+                    f"Cannot merge layer '{name}': shapes {merged['shape']} and "
+                    f"{layer['shape']} differ"
+                )
+            # e.g. sample id strings of different maximum length
+            merged["dtype"] = np.result_type(
+                np.dtype(merged["dtype"]), np.dtype(layer["dtype"])
+            ).str
+            merged["num_samples"] += layer["num_samples"]
+            merged["shards"] += [
+                {"file": os.path.join(prefix, shard["file"]), "rows": shard["rows"]}
+                for shard in layer["shards"]
+            ]
+
+    manifest = {
+        "shard_size": shard_size,
+        "layers": layers,
+        "sketches": sketches,
+        "quantization": quantization,
+        **(extra or {}),
+    }
+    with open(os.path.join(store_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+class _LazyActivations(Mapping):
+    """
+    Shared lookup logic of the read-only activation views.
+
+    Layers are loaded by ``_load_raw`` on first access and cached. Layers listed in
+    ``self.quantization`` are dequantized to float32 transparently, and their auxiliary
+    scale/offset arrays are hidden from iteration.
+    """
+
+    quantization = {}
+
+    def _names(self) -> list:
+        raise NotImplementedError
+
+    def _load_raw(self, name: str) -> np.ndarray:
+        raise NotImplementedError
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._cache:
+            self._cache[name] = self._load(name)
+        return self._cache[name]
+
+    def _load(self, name: str) -> np.ndarray:
+        entry = self.quantization.get(name)
+        if entry is None:
+            return self._load_raw(name)
+
+        scale = offset = None
+        if entry["dtype"] == "int8":
+            scale = self._load_raw(name + SCALE_SUFFIX)
+            offset = self._load_raw(name + OFFSET_SUFFIX)
+        return dequantize(self._load_raw(name), entry["dtype"], scale, offset)
+
+    def __contains__(self, name: object) -> bool:
+        # Look the name up instead of loading the layer, as Mapping would
+        return any(n == name for n in self)
+
+    def __iter__(self):
+        hidden = {
+            name + suffix
+            for name in self.quantization
+            for suffix in (SCALE_SUFFIX, OFFSET_SUFFIX)
+        }
+        return (name for name in self._names() if name not in hidden)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class ActivationStore(_LazyActivations):
+    """
+    Read-only, dict-like view of an activation store written by ``ActivationStoreWriter``.
+
+    Shards are opened memory-mapped only when a layer is indexed. Layers stored in a
+    single shard are returned as read-only memmaps; layers spanning several shards are
+    concatenated once and kept for subsequent lookups. Layers stored in reduced
+    precision are returned dequantized to float32.
+
+    Args:
+        store_dir (str): Directory of the store.
+    """
+
+    def __init__(self, store_dir: str) -> None:
+        if not is_activation_store(store_dir):
+            raise FileNotFoundError(f"No activation store found at '{store_dir}'")
+
+        self.store_dir = store_dir
+        self._cache = {}
+        with open(os.path.join(store_dir, MANIFEST_NAME)) as f:
+            self.manifest = json.load(f)
+        self.quantization = self.manifest.get("quantization", {})
+
+    def _names(self) -> list:
+        return list(self.manifest["layers"])
+
+    def _load_raw(self, name: str) -> np.ndarray:
+        layer = self.manifest["layers"][name]
+        shards = [
+            np.load(os.path.join(self.store_dir, shard["file"]), mmap_mode="r")[
+                : shard["rows"]
+            ]
+            for shard in layer["shards"]
+        ]
+        if not shards:
+            return np.empty((0, *layer["shape"]), dtype=layer["dtype"])
+        if len(shards) == 1:
+            return shards[0]
+        return np.concatenate(shards)
+
+    def sketch(self, name: str) -> Sketch:
+        """
+        Fitted sketch of a layer stored as k-dimensional codes.
+
+        Args:
+            name (str): Layer name.
+
+        Returns:
+            Sketch: Sketch with ``lift`` and ``inverse_transform`` to map CAVs and mean
+                    activations fitted on the codes back to the full activation space.
+        """
+        entry = self.manifest.get("sketches", {}).get(name)
+        if entry is None:
+            raise KeyError(f"Layer '{name}' was not sketched")
+        return load_sketch(os.path.join(self.store_dir, entry["file"]), entry["config"])
+
+
+def _mmap_npz_member(path: str, info: zipfile.ZipInfo) -> np.ndarray | None:
+    """
+    Memory-map an uncompressed ``.npy`` member of an ``.npz`` archive in place.
+
+    Returns None if the member is compressed or holds Python objects, in which case it
+    has to be read through ``np.load`` instead.
+    """
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+
+    with open(path, "rb") as f:
+        # Skip the zip local file header (30 bytes + file name + extra field)
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_len, extra_len = struct.unpack("<HH", local_header[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    if dtype.hasobject:
+        return None
+    if 0 in shape:
+        return np.empty(shape, dtype=dtype)
+
+    return np.memmap(
+        path,
+        dtype=dtype,
+        mode="r",
+        shape=shape,
+        order="F" if fortran_order else "C",
+        offset=offset,
+    )
+
+
+class NpzActivations(_LazyActivations):
+    """
+    Read-only, dict-like view of activations saved as a single ``.npz`` archive.
+
+    Only the archive index is read on construction. A layer is memory-mapped (if it
+    was saved uncompressed, as ``np.savez`` does) or decompressed the first time it is
+    indexed, and kept for subsequent lookups. Layers stored in reduced precision are
+    returned dequantized to float32.
+
+    Args:
+        path (str): Path to the ``.npz`` file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._cache = {}
+        with zipfile.ZipFile(path) as zf:
+            self._members = {
+                info.filename[: -len(".npy")]: info
+                for info in zf.infolist()
+                if info.filename.endswith(".npy")
+            }
+
+        if QUANTIZATION_KEY in self._members:
+            self.quantization = json.loads(str(self._load_raw(QUANTIZATION_KEY)))
+
+    def _names(self) -> list:
+        return [name for name in self._members if name != QUANTIZATION_KEY]
+
+    def _load_raw(self, name: str) -> np.ndarray:
+        array = _mmap_npz_member(self.path, self._members[name])
+        if array is None:
+            with np.load(self.path) as npz:
+                array = npz[name]
+        return array
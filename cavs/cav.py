@@ -1,17 +1,33 @@
+import logging
+
 import numpy as np
 import torch
-from sklearn.linear_model import Ridge
-from sklearn.model_selection import GridSearchCV
-from sklearn.svm import LinearSVC
+from sklearn.linear_model import RidgeCV
+
+from .cav_solvers import (
+    REGULARIZATION_GRID,
+    fit_linear_svm_cv,
+    fit_ridge_loo,
+    fit_sparse_cav,
+)
+from .profiling import span
+
+logger = logging.getLogger(__name__)
 
 
-def compute_cav(vecs: np.ndarray, targets: np.ndarray, cav_type: str = "svm") -> tuple:
+def compute_cav(
+    vecs: np.ndarray,
+    targets: np.ndarray,
+    cav_type: str = "svm",
+    n_nonzero: int | None = None,
+) -> tuple:
     """
     Compute a concept activation vector (CAV) for a set of vectors and targets.
 
     :param vecs:    torch.Tensor of shape (n_samples, n_features)
     :param targets: torch.Tensor of shape (n_samples,)
     :param cav_type:   str, type of CAV to compute. One of ["svm", "ridge", "signal", "mean"]
+    :param n_nonzero:  int, number of nonzero features of "lasso" CAVs (default: select alpha by CV)
     :return:       torch.Tensor of shape (1, n_features)
     """
 
@@ -22,75 +38,154 @@ def compute_cav(vecs: np.ndarray, targets: np.ndarray, cav_type: str = "svm") ->
 
     X = vecs
 
-    if "svm" in cav_type:
-        linear = LinearSVC(random_state=0, fit_intercept=True, max_iter=200)
-        grid_search = GridSearchCV(
-            linear, param_grid={"C": [10**i for i in range(-5, 5)]}
-        )
-        grid_search.fit(X, targets, sample_weight=weights)
-        linear = grid_search.best_estimator_
-        print("Best C:", linear.C)
-        # linear.fit(X, targets, sample_weight=weights)
-        w = torch.Tensor(linear.coef_)
-    elif "ridge" in cav_type:
-        clf = Ridge(alpha=100, fit_intercept=True, random_state=0)
-        grid_search = GridSearchCV(
-            clf, param_grid={"alpha": [10**i for i in range(-5, 5)]}
-        )
-        grid_search.fit(X, targets * 2 - 1, sample_weight=weights)
-        clf = grid_search.best_estimator_
-        print("Best alpha:", clf.alpha)
-        # clf.fit(X, targets * 2 - 1, sample_weight=weights)
-        w = torch.tensor(clf.coef_)[None]
-
-    elif "lasso" in cav_type:
-        from sklearn.linear_model import Lasso
-
-        clf = Lasso(alpha=0.1, fit_intercept=True, max_iter=200, random_state=0)
-
-        grid_search = GridSearchCV(
-            clf, param_grid={"alpha": [10**i for i in range(-5, 5)]}
-        )
-        grid_search.fit(X, targets * 2 - 1, sample_weight=weights)
-        clf = grid_search.best_estimator_
-        print("Best alpha:", clf.alpha)
-        # clf.fit(X, targets * 2 - 1, sample_weight=weights)
-        w = torch.tensor(clf.coef_)[None]
-
-    elif "logistic" in cav_type:
-        from sklearn.linear_model import LogisticRegression
-
-        clf = LogisticRegression(fit_intercept=True, random_state=0)
-
-        grid_search = GridSearchCV(clf, param_grid={"C": [10**i for i in range(-5, 5)]})
-        grid_search.fit(X, targets * 2 - 1, sample_weight=weights)
-        clf = grid_search.best_estimator_
-        print("Best C:", clf.C)
-
-        # clf.fit(X, targets, sample_weight=weights)
-        w = torch.tensor(clf.coef_)
-
-    elif "signal" in cav_type:
-        print("SIGNAL")
-        y = targets
-        mean_y = y.mean()
-        X_residuals = X - X.mean(axis=0)[None]
-        covar = (X_residuals * (y - mean_y)[:, np.newaxis]).sum(axis=0) / (
-            y.shape[0] - 1
-        )
-        vary = np.sum((y - mean_y) ** 2, axis=0) / (y.shape[0] - 1)
-        w = covar / vary
-        w = torch.tensor(w)[None]
-
-    else:
-        raise NotImplementedError()
+    with span("cavs.compute_cav", cav_type=cav_type, activations=X):
+        if "svm" in cav_type:
+            coef, best_C = fit_linear_svm_cv(X, targets, weights, REGULARIZATION_GRID)
+            logger.debug("Best C: %s", best_C)
+            w = torch.Tensor(coef)
+        elif "ridge" in cav_type:
+            # One decomposition of X, the closed-form leave-one-out error selects alpha
+            clf = RidgeCV(alphas=REGULARIZATION_GRID, fit_intercept=True)
+            clf.fit(X, targets * 2 - 1, sample_weight=weights)
+            logger.debug("Best alpha: %s", clf.alpha_)
+            w = torch.tensor(clf.coef_)[None]
+
+        elif "lasso" in cav_type:
+            coef, alpha = fit_sparse_cav(X, targets, weights, n_nonzero=n_nonzero)
+            logger.debug("Best alpha: %s", alpha)
+            w = torch.tensor(coef)
+
+        elif "logistic" in cav_type:
+            from sklearn.linear_model import LogisticRegressionCV
+
+            # Warm-started L-BFGS along the C path in every fold
+            # Accuracy, as the grid search this replaces, is not the default scoring
+            # of every sklearn version
+            clf = LogisticRegressionCV(
+                Cs=REGULARIZATION_GRID,
+                fit_intercept=True,
+                cv=5,
+                scoring="accuracy",
+                random_state=0,
+            )
+            if "use_legacy_attributes" in clf.get_params():
+                clf.set_params(use_legacy_attributes=False)
+            clf.fit(X, targets * 2 - 1, sample_weight=weights)
+            # C_ is a scalar, or one C per class with the legacy attributes
+            logger.debug("Best C: %s", np.ravel(clf.C_)[0])
+            w = torch.tensor(clf.coef_)
+
+        elif "signal" in cav_type:
+            y = targets
+            mean_y = y.mean()
+            X_residuals = X - X.mean(axis=0)[None]
+            covar = (X_residuals * (y - mean_y)[:, np.newaxis]).sum(axis=0) / (
+                y.shape[0] - 1
+            )
+            vary = np.sum((y - mean_y) ** 2, axis=0) / (y.shape[0] - 1)
+            w = covar / vary
+            w = torch.tensor(w)[None]
+
+        else:
+            raise NotImplementedError()
 
     cav = w / torch.sqrt((w**2).sum())
     cav = cav.detach().cpu()
 
     mean_act_nonartif = torch.tensor(X[targets == 0].mean(0), dtype=torch.float32)
     mean_act_artif = torch.tensor(X[targets == 1].mean(0), dtype=torch.float32)
-    print("CAV type: ", cav_type)
-    print("largest CAV values:", torch.topk(cav.flatten(), 10))
+    logger.debug("CAV type: %s", cav_type)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "largest CAV values: %s", torch.topk(cav.flatten(), min(10, cav.numel()))
+        )
 
     return cav, mean_act_nonartif, mean_act_artif
+
+
+def compute_cavs(
+    vecs: np.ndarray,
+    targets: np.ndarray,
+    cav_type: str = "ridge",
+    class_balanced: bool = False,
+) -> tuple:
+    """
+    Compute CAVs for several concepts on the same activations at once.
+
+    Centring and the mean activations are computed once for all concepts, "signal"
+    and "mmp" reduce to a few matrix products. For "ridge", a single SVD of the
+    activations is shared by all concepts and regularisation strengths, and alpha is
+    selected per concept by the closed-form leave-one-out error. Unlike
+    ``compute_cav``, the fit itself is unweighted: only the leave-one-out errors are
+    class-balanced, so with imbalanced concepts the CAVs differ slightly from those of
+    ``compute_cav``. ``class_balanced`` fits the class-balanced sample weights of
+    ``compute_cav`` exactly, at the cost of one SVD per concept. Other CAV types fall
+    back to ``compute_cav`` per concept.
+
+    Args:
+        vecs (np.ndarray): Activations of shape (n_samples, n_features).
+        targets (np.ndarray): Binary targets of shape (n_samples, n_concepts).
+        cav_type (str): One of "ridge", "signal", "mmp" or a type of ``compute_cav``.
+        class_balanced (bool): Fit "ridge" with class-balanced sample weights, as
+            ``compute_cav`` (one SVD per concept).
+
+    Returns:
+        tuple: A tuple containing
+            - cavs (torch.Tensor): CAVs of shape (n_concepts, n_features). Normalised
+              to unit length, except for "mmp" which matches ``compute_mass_mean_probe``.
+            - mean_act_nonartif (torch.Tensor): Mean activations over samples without
+              the concept, shape (n_concepts, n_features).
+            - mean_act_artif (torch.Tensor): Mean activations over samples with the
+              concept, shape (n_concepts, n_features).
+    """
+    X = vecs
+    Y = (np.asarray(targets) == 1).astype(X.dtype if X.dtype.kind == "f" else np.float64)
+    if Y.ndim != 2:
+        raise ValueError("targets must be of shape (n_samples, n_concepts)")
+
+    num_targets = Y.sum(0)
+    num_notargets = len(Y) - num_targets
+    if (num_targets == 0).any() or (num_notargets == 0).any():
+        raise ValueError("Every concept needs both positive and negative samples")
+
+    sum_artif = Y.T @ X
+    mean_act_artif = sum_artif / num_targets[:, None]
+    mean_act_nonartif = (X.sum(0)[None] - sum_artif) / num_notargets[:, None]
+
+    with span(
+        "cavs.compute_cavs", cav_type=cav_type, activations=X, concepts=Y.shape[1]
+    ):
+        if "ridge" in cav_type:
+            weights = Y / num_targets + (1 - Y) / num_notargets
+            weights = weights / weights.max(0)
+            if class_balanced:
+                w, alphas = fit_ridge_loo(
+                    X, Y * 2 - 1, REGULARIZATION_GRID, sample_weight=weights
+                )
+            else:
+                w, alphas = fit_ridge_loo(
+                    X, Y * 2 - 1, REGULARIZATION_GRID, score_weights=weights
+                )
+            logger.debug("Best alphas: %s", alphas)
+        elif "signal" in cav_type:
+            # Covariance of every feature with every target over the target variance
+            Yc = Y - Y.mean(0)
+            covar = (X - X.mean(0)).T @ Yc / (len(Y) - 1)
+            vary = (Yc**2).sum(0) / (len(Y) - 1)
+            w = (covar / vary).T
+        elif cav_type == "mmp":
+            w = mean_act_artif - mean_act_nonartif
+        else:
+            w = torch.cat(
+                [compute_cav(X, targets[:, i], cav_type)[0] for i in range(Y.shape[1])]
+            ).numpy()
+
+    cavs = torch.tensor(w, dtype=torch.float32)
+    if cav_type != "mmp":
+        cavs = cavs / cavs.norm(dim=1, keepdim=True)
+
+    return (
+        cavs,
+        torch.tensor(mean_act_nonartif, dtype=torch.float32),
+        torch.tensor(mean_act_artif, dtype=torch.float32),
+    )
@@ -0,0 +1,383 @@
+import numpy as np
+from scipy.optimize import minimize
+from sklearn.model_selection import KFold, StratifiedKFold
+
+# Regularisation grid shared by all CAV solvers
+REGULARIZATION_GRID = [10**i for i in range(-5, 5)]
+
+
+def _squared_hinge_objective(params, X, y, sample_weight, C):
+    # 0.5 * ||w||^2 + C * sum_i s_i * max(0, 1 - y_i * (w . x_i + b))^2,
+    # i.e. the primal problem of LinearSVC with an unpenalised intercept
+    w, b = params[:-1], params[-1]
+    margins = y * (X @ w.astype(X.dtype, copy=False) + b)
+    slack = np.maximum(0, 1 - margins)
+
+    loss = 0.5 * w @ w + C * (sample_weight * slack**2).sum()
+    coef = -2 * C * sample_weight * slack * y
+    grad = np.empty_like(params)
+    grad[:-1] = w + X.T @ coef.astype(X.dtype, copy=False)
+    grad[-1] = coef.sum()
+    return loss, grad
+
+
+def squared_hinge_svm_path(
+    X: np.ndarray,
+    y: np.ndarray,
+    sample_weight: np.ndarray,
+    Cs: list,
+    max_iter: int = 200,
+    init: np.ndarray | None = None,
+) -> list[np.ndarray]:
+    """
+    Fit a squared-hinge linear SVM for every C, warm-starting each fit from the last.
+
+    Args:
+        X (np.ndarray): Features of shape (n_samples, n_features).
+        y (np.ndarray): Targets in {-1, 1} of shape (n_samples,).
+        sample_weight (np.ndarray): Sample weights of shape (n_samples,).
+        Cs (list): Inverse regularisation strengths in ascending order.
+        max_iter (int): Maximum number of L-BFGS iterations per C.
+        init (np.ndarray, optional): Initial parameters (w, b) of the first fit.
+
+    Returns:
+        list: Parameters (w, b) of shape (n_features + 1,) for every C.
+    """
+    params = np.zeros(X.shape[1] + 1) if init is None else init.astype(np.float64)
+    y = y.astype(np.float64)
+    sample_weight = sample_weight.astype(np.float64)
+
+    path = []
+    for C in Cs:
+        params = minimize(
+            _squared_hinge_objective,
+            params,
+            args=(X, y, sample_weight, C),
+            jac=True,
+            method="L-BFGS-B",
+            options={"maxiter": max_iter},
+        ).x
+        path.append(params)
+    return path
+
+
+def fit_linear_svm_cv(
+    X: np.ndarray,
+    targets: np.ndarray,
+    sample_weight: np.ndarray,
+    Cs: list = REGULARIZATION_GRID,
+    cv: int = 5,
+    max_iter: int = 200,
+) -> tuple[np.ndarray, float]:
+    """
+    Select C by stratified cross-validated accuracy along a warm-started path.
+
+    Replaces a grid search of independent LinearSVC fits: every fold fits the whole
+    C grid as one path, and the final model continues the path on all samples.
+
+    Args:
+        X (np.ndarray): Features of shape (n_samples, n_features).
+        targets (np.ndarray): Binary targets in {0, 1} of shape (n_samples,).
+        sample_weight (np.ndarray): Sample weights of shape (n_samples,).
+        Cs (list): Candidate values of C.
+        cv (int): Number of folds.
+        max_iter (int): Maximum number of L-BFGS iterations per C.
+
+    Returns:
+        tuple: A tuple containing
+            - coef (np.ndarray): Weights of shape (1, n_features).
+            - best_C (float): The selected C.
+    """
+    Cs = sorted(Cs)
+    y = np.where(targets == 1, 1.0, -1.0)
+
+    scores = np.zeros(len(Cs))
+    for train, test in StratifiedKFold(n_splits=cv).split(X, targets):
+        path = squared_hinge_svm_path(
+            X[train], y[train], sample_weight[train], Cs, max_iter
+        )
+        for i, params in enumerate(path):
+            pred = np.sign(X[test] @ params[:-1].astype(X.dtype) + params[-1])
+            scores[i] += (pred == y[test]).mean()
+
+    best = int(np.argmax(scores))
+    params = squared_hinge_svm_path(X, y, sample_weight, Cs[: best + 1], max_iter)[-1]
+    return params[None, :-1], Cs[best]
+
+
+# Leave-one-out leverages are clipped below 1, which they reach when n <= d
+_MAX_LEVERAGE = 1 - 1e-10
+
+
+def _ridge_loo(
+    Xc: np.ndarray,
+    Yc: np.ndarray,
+    alphas: list,
+    intercept_leverage: np.ndarray | float,
+    score_weights: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Ridge of (already centred and scaled) targets on one SVD of the features
+    U, s, Vt = np.linalg.svd(Xc, full_matrices=False)
+    UtY = U.T @ Yc
+    U2 = U**2
+
+    best_error = np.full(Yc.shape[1], np.inf)
+    best_alphas = np.zeros(Yc.shape[1])
+    for alpha in alphas:
+        shrink = s**2 / (s**2 + alpha)
+        residuals = Yc - U @ (shrink[:, None] * UtY)
+        # Leverage of the ridge fit plus that of the intercept
+        leverage = np.minimum(U2 @ shrink + intercept_leverage, _MAX_LEVERAGE)
+        errors = (residuals / (1 - leverage)[:, None]) ** 2
+        if score_weights is not None:
+            errors = errors * score_weights
+        errors = errors.sum(0)
+
+        better = np.isfinite(errors) & (errors < best_error)
+        best_error[better] = errors[better]
+        best_alphas[better] = alpha
+
+    if not np.isfinite(best_error).all():
+        raise ValueError("No regularisation strength gives a finite leave-one-out error")
+
+    coef = Vt.T @ (s[:, None] / (s[:, None] ** 2 + best_alphas[None]) * UtY)
+    return coef.T, best_alphas
+
+
+def fit_ridge_loo(
+    X: np.ndarray,
+    Y: np.ndarray,
+    alphas: list = REGULARIZATION_GRID,
+    score_weights: np.ndarray | None = None,
+    sample_weight: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Ridge regression of several targets on one SVD, with alpha selected per target.
+
+    The leave-one-out residuals of every alpha follow in closed form from the SVD of
+    the centred features, e_i / (1 - h_ii), so X is decomposed once for all targets
+    and all alphas. With per-target ``sample_weight`` the fit is weighted as in
+    ``RidgeCV(...).fit(X, y, sample_weight)``, which needs one SVD per target.
+
+    Args:
+        X (np.ndarray): Features of shape (n_samples, n_features).
+        Y (np.ndarray): Targets of shape (n_samples, n_targets).
+        alphas (list): Candidate regularisation strengths.
+        score_weights (np.ndarray, optional): Weights of the leave-one-out squared
+            errors of an unweighted fit, of shape (n_samples, n_targets).
+        sample_weight (np.ndarray, optional): Sample weights of the fit and of the
+            leave-one-out errors, of shape (n_samples, n_targets).
+
+    Returns:
+        tuple: A tuple containing
+            - coef (np.ndarray): Weights of shape (n_targets, n_features).
+            - best_alphas (np.ndarray): The selected alpha per target.
+    """
+    if sample_weight is None:
+        Xc, Yc = X - X.mean(0), Y - Y.mean(0)
+        return _ridge_loo(Xc, Yc, alphas, 1 / len(X), score_weights)
+
+    coefs, best_alphas = [], []
+    for y, w in zip(Y.T, sample_weight.T):
+        sqrt_w = np.sqrt(w)[:, None]
+        # Weighted centring, then rescaling by sqrt(w) turns the weighted fit into
+        # an ordinary one; the intercept adds a leverage of w_i / sum(w)
+        Xc = sqrt_w * (X - w @ X / w.sum())
+        yc = sqrt_w * (y - w @ y / w.sum())[:, None]
+        coef, alpha = _ridge_loo(Xc, yc, alphas, w / w.sum())
+        coefs.append(coef)
+        best_alphas.append(alpha)
+    return np.concatenate(coefs), np.concatenate(best_alphas)
+
+
+def _soft_threshold(x: np.ndarray, threshold: float) -> np.ndarray:
+    return np.sign(x) * np.maximum(np.abs(x) - threshold, 0)
+
+
+def _lasso_fista(
+    XS: np.ndarray, ys: np.ndarray, lam: float, init: np.ndarray, tol: float, max_iter: int
+) -> np.ndarray:
+    # min_beta 0.5 * ||ys - XS beta||^2 + lam * ||beta||_1
+    n, k = XS.shape
+    if k == 0:
+        return init
+    # Work with the smaller of the two Gram matrices
+    if k <= n:
+        G, b = XS.T @ XS, XS.T @ ys
+        gradient = lambda z: G @ z - b  # noqa: E731
+        L = np.linalg.eigvalsh(G)[-1]
+    else:
+        gradient = lambda z: XS.T @ (XS @ z - ys)  # noqa: E731
+        L = np.linalg.eigvalsh(XS @ XS.T)[-1]
+    if L <= 0:
+        return np.zeros_like(init)
+
+    x, z, t = init, init, 1.0
+    for _ in range(max_iter):
+        x_new = _soft_threshold(z - gradient(z) / L, lam / L)
+        t_new = (1 + np.sqrt(1 + 4 * t**2)) / 2
+        z = x_new + (t - 1) / t_new * (x_new - x)
+        converged = np.abs(x_new - x).max() <= tol * max(1.0, np.abs(x_new).max())
+        x, t = x_new, t_new
+        if converged:
+            break
+    return x
+
+
+def _top(scores: np.ndarray, mask: np.ndarray, k: int) -> np.ndarray:
+    # Indices of the k highest scores among the masked entries
+    candidates = np.flatnonzero(mask)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+    return candidates
+
+
+def lasso_path(
+    X: np.ndarray,
+    y: np.ndarray,
+    sample_weight: np.ndarray,
+    alphas: list,
+    tol: float = 1e-4,
+    max_iter: int = 1000,
+):
+    """
+    Weighted lasso along a decreasing alpha path with screening and an active set.
+
+    Solves min 1 / (2 sum(w)) * sum_i w_i (y_i - b - x_i . beta)^2 + alpha * ||beta||_1
+    (the objective of sklearn's ``Lasso``) for every alpha, warm-starting from the
+    previous solution. Each fit is restricted to the features kept by the sequential
+    strong rule plus the previous support (the strongest ones only, if there are many).
+    After solving on that set, features eliminated by the gap-safe sphere test are
+    dropped from it, and the strongest features violating the KKT conditions are added
+    until none are left. Only the
+    columns of the working set are ever copied; X is centred implicitly.
+
+    Args:
+        X (np.ndarray): Features of shape (n_samples, n_features), may be a memmap.
+        y (np.ndarray): Targets of shape (n_samples,).
+        sample_weight (np.ndarray): Sample weights of shape (n_samples,).
+        alphas (list): Regularisation strengths in decreasing order.
+        tol (float): Relative tolerance of the KKT check and the inner solver.
+        max_iter (int): Maximum number of FISTA iterations per working set.
+
+    Yields:
+        tuple: (alpha, coef, intercept) for every alpha.
+    """
+    w = sample_weight.astype(np.float64)
+    total_weight = w.sum()
+    sqrt_w = np.sqrt(w)
+    mean = (w.astype(X.dtype) @ X).astype(np.float64) / total_weight
+    ys = sqrt_w * (y - w @ y / total_weight)
+
+    def correlation(v):
+        # Centred, weighted X^T v without forming the centred matrix
+        v = sqrt_w * v
+        return (X.T @ v.astype(X.dtype)).astype(np.float64) - mean * v.sum()
+
+    col_norms = np.einsum("i,ij,ij->j", w.astype(X.dtype), X, X).astype(np.float64)
+    col_norms = np.sqrt(np.maximum(col_norms - total_weight * mean**2, 0))
+
+    c = correlation(ys)
+    prev_lam = np.abs(c).max()
+    beta = np.zeros(X.shape[1])
+    for alpha in alphas:
+        lam = alpha * total_weight
+        # Working set: the previous support plus the strongest features passing the
+        # sequential strong rule, at most max(2 * support, 64) features at a time
+        size = max(2 * int((beta != 0).sum()), 64)
+        working = beta != 0
+        working[_top(np.abs(c), ~working & (np.abs(c) >= 2 * lam - prev_lam), size)] = True
+        while True:
+            S = np.flatnonzero(working)
+            XS = sqrt_w[:, None] * (np.asarray(X[:, S], dtype=np.float64) - mean[S])
+            beta_S = _lasso_fista(XS, ys, lam, beta[S], tol * 1e-2, max_iter)
+            beta[:] = 0
+            beta[S] = beta_S
+
+            residual = ys - XS @ beta_S
+            c = correlation(residual)
+
+            # Gap-safe sphere test on the rescaled dual point
+            dual_scale = max(lam, np.abs(c).max())
+            theta = residual / dual_scale
+            primal = 0.5 * residual @ residual + lam * np.abs(beta_S).sum()
+            dual = 0.5 * ys @ ys - 0.5 * lam**2 * ((theta - ys / lam) ** 2).sum()
+            radius = np.sqrt(2 * max(primal - dual, 0)) / lam
+            safe = np.abs(c) / dual_scale + col_norms * radius < 1
+
+            violators = ~working & ~safe & (np.abs(c) > lam * (1 + tol))
+            if not violators.any():
+                break
+            working &= ~safe
+            working[_top(np.abs(c), violators, size)] = True
+
+        prev_lam = lam
+        yield alpha, beta.copy(), w @ y / total_weight - mean @ beta
+
+
+def fit_sparse_cav(
+    X: np.ndarray,
+    targets: np.ndarray,
+    sample_weight: np.ndarray,
+    n_nonzero: int | None = None,
+    n_alphas: int = 30,
+    eps: float = 1e-2,
+    cv: int = 5,
+    tol: float = 1e-4,
+    max_iter: int = 1000,
+) -> tuple[np.ndarray, float]:
+    """
+    Sparse (lasso) CAV on the +-1 targets with a screened, warm-started alpha path.
+
+    The path runs over ``n_alphas`` values spaced geometrically below the smallest
+    alpha with an all-zero solution, down to ``eps`` times that value, so no alpha
+    yields an all-zero CAV on all samples. With ``n_nonzero``, the path stops at the
+    first alpha with at least that many nonzero features and keeps the ``n_nonzero``
+    largest weights. Otherwise alpha is selected by the weighted held-out squared
+    error of ``cv`` shuffled folds.
+
+    Args:
+        X (np.ndarray): Features of shape (n_samples, n_features).
+        targets (np.ndarray): Binary targets in {0, 1} of shape (n_samples,).
+        sample_weight (np.ndarray): Sample weights of shape (n_samples,).
+        n_nonzero (int, optional): Number of nonzero features (e.g. channels of a
+            pooled layer) of the CAV.
+        n_alphas (int): Number of alphas on the path.
+        eps (float): Ratio of the smallest to the largest alpha.
+        cv (int): Number of folds.
+        tol (float): Relative tolerance of the solver.
+        max_iter (int): Maximum number of iterations of the inner solver.
+
+    Returns:
+        tuple: A tuple containing
+            - coef (np.ndarray): Weights of shape (1, n_features).
+            - alpha (float): The selected alpha.
+    """
+    y = np.where(targets == 1, 1.0, -1.0)
+    w = sample_weight.astype(np.float64)
+    mean = (w.astype(X.dtype) @ X).astype(np.float64) / w.sum()
+    v = w * (y - w @ y / w.sum())
+    alpha_max = np.abs((X.T @ v.astype(X.dtype)) - mean * v.sum()).max() / w.sum()
+    alphas = alpha_max * np.geomspace(1, eps, n_alphas + 1)[1:]
+
+    if n_nonzero is not None:
+        for alpha, coef, _ in lasso_path(X, y, w, alphas, tol, max_iter):
+            if (coef != 0).sum() >= n_nonzero:
+                break
+        keep = np.argsort(-np.abs(coef))[:n_nonzero]
+        sparse = np.zeros_like(coef)
+        sparse[keep] = coef[keep]
+        return sparse[None], alpha
+
+    errors = np.zeros(n_alphas)
+    # Activations are usually ordered by label, so the folds are shuffled
+    for train, test in KFold(n_splits=cv, shuffle=True, random_state=0).split(X):
+        path = lasso_path(X[train], y[train], w[train], alphas, tol, max_iter)
+        for i, (_, coef, intercept) in enumerate(path):
+            residual = y[test] - (X[test] @ coef.astype(X.dtype) + intercept)
+            errors[i] += w[test] @ residual**2 / w[test].sum()
+
+    best = int(np.argmin(errors))
+    for alpha, coef, _ in lasso_path(X, y, w, alphas[: best + 1], tol, max_iter):
+        pass
+    return coef[None], alpha
@@ -0,0 +1,340 @@
+import logging
+
+import numpy as np
+import torch
+from tqdm import tqdm
+
+from .cav_solvers import REGULARIZATION_GRID
+from .profiling import profiled
+from .reducers import get_reducer
+from .sketch import Sketch
+
+STATISTICS_CAV_TYPES = ("signal", "mmp", "ridge")
+# Largest number of features of "ridge" without a sketch; its two float64 second
+# moment matrices take 1 GiB at this size
+MAX_RIDGE_FEATURES = 8192
+
+logger = logging.getLogger(__name__)
+
+
+def _as_batch(x, device: str) -> torch.Tensor:
+    if not isinstance(x, torch.Tensor):
+        x = torch.from_numpy(np.ascontiguousarray(x))
+    return x.detach().to(device=device, dtype=torch.float64).flatten(start_dim=1)
+
+
+def accumulate_from_activations(activations, layer: str, labels, update, batch_size: int):
+    """
+    Feed a stored layer to ``update(values, labels)`` in blocks of ``batch_size`` rows.
+    """
+    values = activations[layer]
+    for start in range(0, len(values), batch_size):
+        update(values[start : start + batch_size], labels[start : start + batch_size])
+
+
+def accumulate_from_dataloader(
+    model: torch.nn.Module,
+    dataloader: torch.utils.data.DataLoader,
+    layer: str,
+    update,
+    device: str,
+    label_column: int = 1,
+    reducer=None,
+    desc: str = "Accumulating statistics",
+) -> None:
+    """
+    Feed the (reduced) output of a hooked layer and the labels of every batch to
+    ``update(values, labels)``, without storing activations.
+    """
+    from .extract_activations import get_layer_by_name
+
+    reducer = get_reducer(reducer)
+    current_labels = None
+    seen = False
+
+    def hook(module, input, output):
+        nonlocal seen
+        # Modules called more than once per forward pass are only counted once
+        if seen:
+            return
+        seen = True
+        output = output.detach()
+        if reducer is not None:
+            output = reducer(output)
+        update(output, current_labels)
+
+    model.eval()
+    model.to(device)
+    handle = get_layer_by_name(model, layer).register_forward_hook(hook)
+    try:
+        with torch.no_grad():
+            for batch in tqdm(dataloader, desc=desc):
+                current_labels = torch.as_tensor(batch[1 + label_column]).cpu()
+                seen = False
+                model(batch[0].to(device))
+    finally:
+        handle.remove()
+
+
+class CAVStatistics:
+    """
+    Streaming sufficient statistics of a CAV, so activations never have to fit in memory.
+
+    Batches of activations and binary targets are consumed with ``update``. Per class,
+    the sample count and the sum of the activations are accumulated, which is all that
+    "signal" and mass-mean ("mmp") CAVs need. "ridge" additionally accumulates the
+    per-class second moments X^T X, which are k x k when a stateless ``sketch`` (e.g. a
+    ``RandomProjectionSketch``) projects the batches first; the ridge CAV is then
+    lifted back to the full activation space. Without a sketch, "ridge" is limited to
+    ``MAX_RIDGE_FEATURES`` features. Statistics of different workers or data parts are
+    combined with ``merge``.
+
+    Ridge matches the class-balanced weighted ridge of ``compute_cav``, with alpha
+    selected by generalised cross-validation, which only needs these statistics.
+
+    Args:
+        cav_type (str): One of "signal", "mmp" or "ridge".
+        sketch (Sketch, optional): Stateless sketch applied before accumulating the
+            second moments of "ridge".
+        device (str): Device the statistics are accumulated on.
+    """
+
+    def __init__(
+        self, cav_type: str = "signal", sketch: Sketch | None = None, device: str = "cpu"
+    ) -> None:
+        if cav_type not in STATISTICS_CAV_TYPES:
+            raise ValueError(
+                f"Unknown CAV type '{cav_type}'. Use one of {STATISTICS_CAV_TYPES}."
+            )
+        if sketch is not None and not sketch.stateless:
+            raise ValueError("Only stateless sketches can be used for streaming CAVs")
+        self.cav_type = cav_type
+        self.sketch = sketch
+        self.device = device
+        self.counts = torch.zeros(2, dtype=torch.float64, device=device)
+        self.sums = None
+        self.code_sums = None
+        self.second_moments = None
+
+    def update(self, x: np.ndarray | torch.Tensor, targets: np.ndarray | torch.Tensor) -> None:
+        """
+        Add a batch of activations of shape (N, ...) with binary targets of shape (N,).
+        """
+        x = _as_batch(x, self.device)
+        y = torch.as_tensor(np.asarray(targets) == 1, device=self.device)
+        onehot = torch.stack([~y, y]).double()
+
+        d = x.shape[1]
+        if self.cav_type == "ridge" and self.sketch is None and d > MAX_RIDGE_FEATURES:
+            raise ValueError(
+                f"Ridge statistics of {d} features need two {d} x {d} matrices. "
+                f"Pass a sketch (sketch=...) to reduce them to at most "
+                f"{MAX_RIDGE_FEATURES} features, or pool the layer."
+            )
+
+        if self.sums is None:
+            self.sums = torch.zeros(2, x.shape[1], dtype=torch.float64, device=self.device)
+        self.counts += onehot.sum(1)
+        self.sums += onehot @ x
+
+        if self.cav_type != "ridge":
+            return
+
+        codes = x if self.sketch is None else self.sketch.transform(x.float()).double()
+        if self.second_moments is None:
+            k = codes.shape[1]
+            self.code_sums = torch.zeros(2, k, dtype=torch.float64, device=self.device)
+            self.second_moments = torch.zeros(
+                2, k, k, dtype=torch.float64, device=self.device
+            )
+        self.code_sums += onehot @ codes
+        for c in range(2):
+            selected = codes[onehot[c].bool()]
+            self.second_moments[c] += selected.T @ selected
+
+    def merge(self, other: "CAVStatistics") -> "CAVStatistics":
+        """
+        Add the statistics of another accumulator, e.g. of another worker, in place.
+        """
+        if other.cav_type != self.cav_type:
+            raise ValueError("Cannot merge statistics of different CAV types")
+        if other.sums is None:
+            return self
+        if self.sums is None:
+            self.sums = torch.zeros_like(other.sums, device=self.device)
+            if other.second_moments is not None:
+                self.code_sums = torch.zeros_like(other.code_sums, device=self.device)
+                self.second_moments = torch.zeros_like(
+                    other.second_moments, device=self.device
+                )
+
+        self.counts += other.counts.to(self.device)
+        self.sums += other.sums.to(self.device)
+        if self.second_moments is not None:
+            self.code_sums += other.code_sums.to(self.device)
+            self.second_moments += other.second_moments.to(self.device)
+        return self
+
+    def _ridge(self, alphas: list) -> torch.Tensor:
+        n = self.counts.sum()
+        # Class-balanced sample weights, as in compute_cav
+        class_weights = 1 / self.counts
+        class_weights = class_weights / class_weights.max()
+        class_targets = torch.tensor([-1.0, 1.0], dtype=torch.float64, device=self.device)
+
+        total_weight = (class_weights * self.counts).sum()
+        mean = (class_weights @ self.code_sums) / total_weight
+        mean_target = (class_weights * self.counts) @ class_targets / total_weight
+
+        # Weighted scatter of the centred activations and their covariance with y
+        scatter = (class_weights[:, None, None] * self.second_moments).sum(0)
+        scatter -= total_weight * torch.outer(mean, mean)
+        centred_targets = class_targets - mean_target
+        cross = (
+            class_weights[:, None]
+            * centred_targets[:, None]
+            * (self.code_sums - self.counts[:, None] * mean[None])
+        ).sum(0)
+        target_scatter = (class_weights * self.counts * centred_targets**2).sum()
+
+        eigvals, V = torch.linalg.eigh(scatter)
+        eigvals = eigvals.clamp_min(0)
+        projected = V.T @ cross
+
+        best_gcv, best_alpha = None, None
+        for alpha in alphas:
+            # RSS = S_yy - 2 w^T b + w^T C w with w = (C + alpha I)^-1 b
+            rss = target_scatter - (
+                projected**2 * (2 / (eigvals + alpha) - eigvals / (eigvals + alpha) ** 2)
+            ).sum()
+            dof = (eigvals / (eigvals + alpha)).sum() + 1
+            gcv = (rss / (1 - dof / n) ** 2).item()
+            if best_gcv is None or gcv < best_gcv:
+                best_gcv, best_alpha = gcv, alpha
+        logger.debug("Best alpha: %s", best_alpha)
+
+        w = V @ (projected / (eigvals + best_alpha))
+        if self.sketch is not None:
+            w = self.sketch.lift(w.float()).to(self.device).double()
+        return w
+
+    @profiled("cavs.CAVStatistics.finalize")
+    def finalize(self, alphas: list = REGULARIZATION_GRID) -> tuple:
+        """
+        Compute the CAV from the accumulated statistics.
+
+        Args:
+            alphas (list): Candidate regularisation strengths of "ridge".
+
+        Returns:
+            tuple: A tuple containing
+                - cav (torch.Tensor): The CAV of shape (1, n_features), normalised
+                  except for "mmp" (as ``compute_mass_mean_probe``).
+                - mean_act_nonartif (torch.Tensor): Mean activation over non-artifact samples.
+                - mean_act_artif (torch.Tensor): Mean activation over artifact samples.
+        """
+        if self.sums is None or (self.counts == 0).any():
+            raise ValueError("Both classes need at least one sample")
+
+        n = self.counts.sum()
+        mean_act_nonartif = self.sums[0] / self.counts[0]
+        mean_act_artif = self.sums[1] / self.counts[1]
+
+        match self.cav_type:
+            case "mmp":
+                w = mean_act_artif - mean_act_nonartif
+            case "signal":
+                mean_y = self.counts[1] / n
+                # X^T (y - mean_y), and the variance of y, from the class counts
+                covar = (self.sums[1] - mean_y * self.sums.sum(0)) / (n - 1)
+                vary = (
+                    self.counts[1] * (1 - mean_y) ** 2 + self.counts[0] * mean_y**2
+                ) / (n - 1)
+                w = covar / vary
+            case "ridge":
+                w = self._ridge(alphas)
+
+        if self.cav_type != "mmp":
+            w = w / w.norm()
+
+        return (
+            w[None].float().cpu(),
+            mean_act_nonartif.float().cpu(),
+            mean_act_artif.float().cpu(),
+        )
+
+    @classmethod
+    def from_activations(
+        cls,
+        activations,
+        layer: str,
+        targets: np.ndarray,
+        cav_type: str = "signal",
+        batch_size: int = 4096,
+        sketch: Sketch | None = None,
+        device: str = "cpu",
+    ) -> "CAVStatistics":
+        """
+        Accumulate statistics over a stored layer, reading ``batch_size`` rows at a time.
+
+        Args:
+            activations (Mapping): Activations as returned by ``extract_activations``,
+                e.g. a memory-mapped ``ActivationStore``.
+            layer (str): Name of the layer.
+            targets (np.ndarray): Binary targets of shape (n_samples,).
+            cav_type (str): One of "signal", "mmp" or "ridge".
+            batch_size (int): Number of samples read at a time.
+            sketch (Sketch, optional): Stateless sketch for "ridge".
+            device (str): Device the statistics are accumulated on.
+
+        Returns:
+            CAVStatistics: The accumulated statistics.
+        """
+        statistics = cls(cav_type, sketch, device)
+        accumulate_from_activations(
+            activations, layer, targets, statistics.update, batch_size
+        )
+        return statistics
+
+    @classmethod
+    def from_dataloader(
+        cls,
+        model: torch.nn.Module,
+        dataloader: torch.utils.data.DataLoader,
+        layer: str,
+        device: str = "cuda",
+        cav_type: str = "signal",
+        label_column: int = 1,
+        reducer=None,
+        sketch: Sketch | None = None,
+    ) -> "CAVStatistics":
+        """
+        Accumulate statistics straight from a forward hook, without storing activations.
+
+        Args:
+            model (nn.Module): The PyTorch model.
+            dataloader (DataLoader): Yields batches (data, *label_columns).
+            layer (str): Dot-separated name of the hooked layer.
+            device (str): Device to run the model and accumulate on.
+            cav_type (str): One of "signal", "mmp" or "ridge".
+            label_column (int): Label column holding the binary targets, i.e. the
+                column used from ``activations["labels"]`` for stored activations.
+            reducer (str or callable, optional): Reducer applied to the layer output,
+                see ``cavs.reducers``.
+            sketch (Sketch, optional): Stateless sketch for "ridge".
+
+        Returns:
+            CAVStatistics: The accumulated statistics.
+        """
+        statistics = cls(cav_type, sketch, device)
+        accumulate_from_dataloader(
+            model,
+            dataloader,
+            layer,
+            statistics.update,
+            device,
+            label_column,
+            reducer,
+            desc="Accumulating CAV statistics",
+        )
+        return statistics
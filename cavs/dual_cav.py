@@ -0,0 +1,154 @@
+import logging
+
+import numpy as np
+import torch
+
+from .cav_solvers import REGULARIZATION_GRID
+from .profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+DUAL_CAV_TYPES = ("ridge", "lssvm", "signal")
+
+
+def _feature_chunks(X, chunk_size: int, device: str):
+    """
+    Yield (start, chunk) with float64 column blocks of X on the device.
+    """
+    for start in range(0, X.shape[1], chunk_size):
+        chunk = X[:, start : start + chunk_size]
+        if not isinstance(chunk, torch.Tensor):
+            chunk = torch.from_numpy(np.ascontiguousarray(chunk))
+        yield start, chunk.to(device=device, dtype=torch.float64)
+
+
+@profiled("cavs.compute_cav_dual")
+def compute_cav_dual(
+    vecs: np.ndarray | torch.Tensor,
+    targets: np.ndarray | torch.Tensor,
+    cav_type: str = "ridge",
+    alphas: list = REGULARIZATION_GRID,
+    device: str = "cpu",
+    chunk_size: int = 8192,
+    return_alpha: bool = False,
+) -> tuple:
+    """
+    Compute a CAV in the dual, for layers with many more features than samples.
+
+    The activations are only read in blocks of ``chunk_size`` features, which build the
+    (n_samples, n_samples) Gram matrix and the class means. No (n_features, n_features)
+    object is ever formed, and memory-mapped arrays are never loaded as a whole.
+
+    "ridge" and "lssvm" solve the class-balanced weighted ridge regression of the
+    +-1 targets (the LS-SVM classifier with gamma = 1 / alpha) from one
+    eigendecomposition of the Gram matrix, which gives the leave-one-out residuals of
+    every alpha in closed form. "ridge" selects alpha by the leave-one-out squared
+    error, "lssvm" by the class-balanced leave-one-out misclassification rate.
+    "signal" matches the "signal" CAV of ``compute_cav`` and needs no Gram matrix.
+
+    Args:
+        vecs (np.ndarray or torch.Tensor): Activations of shape (n_samples, ...), e.g.
+            a memory-mapped layer of an activation store.
+        targets (np.ndarray or torch.Tensor): Binary targets of shape (n_samples,).
+        cav_type (str): One of "ridge", "lssvm" or "signal".
+        alphas (list): Candidate regularisation strengths.
+        device (str): Device to compute on.
+        chunk_size (int): Number of features read at a time.
+        return_alpha (bool): Also return the selected regularisation strength.
+
+    Returns:
+        tuple: A tuple containing
+            - cav (torch.Tensor): The normalised CAV of shape (1, n_features).
+            - mean_act_nonartif (torch.Tensor): Mean activation over non-artifact samples.
+            - mean_act_artif (torch.Tensor): Mean activation over artifact samples.
+            - alpha (float or None): With ``return_alpha``, the selected alpha (the
+              LS-SVM gamma is 1 / alpha), None for "signal".
+    """
+    if cav_type not in DUAL_CAV_TYPES:
+        raise ValueError(f"Unknown dual CAV type '{cav_type}'. Use one of {DUAL_CAV_TYPES}.")
+
+    X = vecs.reshape(len(vecs), -1) if vecs.ndim > 2 else vecs
+    n = X.shape[0]
+    y = torch.as_tensor(np.asarray(targets) == 1, device=device, dtype=torch.float64)
+    num_targets = y.sum()
+    num_notargets = n - num_targets
+
+    # Class-balanced sample weights, as in compute_cav
+    weights = y / num_targets + (1 - y) / num_notargets
+    weights = weights / weights.max()
+    p = weights / weights.sum()
+
+    sum_artif = torch.zeros(X.shape[1], dtype=torch.float64, device=device)
+    sum_all = torch.zeros_like(sum_artif)
+    K = torch.zeros(n, n, dtype=torch.float64, device=device)
+    for start, chunk in _feature_chunks(X, chunk_size, device):
+        end = start + chunk.shape[1]
+        sum_artif[start:end] = y @ chunk
+        sum_all[start:end] = chunk.sum(0)
+        if cav_type != "signal":
+            K += chunk @ chunk.T
+
+    mean_act_artif = sum_artif / num_targets
+    mean_act_nonartif = (sum_all - sum_artif) / num_notargets
+
+    best_alpha = None
+    if cav_type == "signal":
+        # covar = Xc^T yc / (n - 1) and Xc^T yc = X^T yc since yc sums to zero
+        yc = y - y.mean()
+        vary = (yc**2).sum() / (n - 1)
+        w = torch.cat([yc @ chunk for _, chunk in _feature_chunks(X, chunk_size, device)])
+        w = w / (n - 1) / vary
+    else:
+        # Centre on the weighted mean, Kc = (I - 1 p^T) K (I - p 1^T)
+        Kp = K @ p
+        Kc = K - Kp[None] - Kp[:, None] + p @ Kp
+        sqrt_w = weights.sqrt()
+        Ks = sqrt_w[:, None] * Kc * sqrt_w[None]
+        y_pm = 2 * y - 1
+        ys = sqrt_w * (y_pm - p @ y_pm)
+
+        eigvals, Q = torch.linalg.eigh(Ks)
+        eigvals = eigvals.clamp_min(0)
+        Qty = Q.T @ ys
+        Q2 = Q**2
+
+        best_score, best_alpha = None, None
+        for alpha in alphas:
+            shrink = eigvals / (eigvals + alpha)
+            residuals = ys - Q @ (shrink * Qty)
+            # Leverage of the dual fit plus that of the (weighted) intercept
+            leverage = Q2 @ shrink + weights / weights.sum()
+            loo = residuals / (1 - leverage)
+            squared_error = (loo**2).sum()
+            if cav_type == "lssvm":
+                # LOO prediction = target - LOO residual, mapped back from scaled space
+                prediction = y_pm - loo / sqrt_w
+                errors = (torch.sign(prediction) != y_pm).double()
+                score = ((weights * errors).sum().item(), squared_error.item())
+            else:
+                score = (squared_error.item(),)
+            if best_score is None or score < best_score:
+                best_score, best_alpha = score, alpha
+
+        a = Q @ (Qty / (eigvals + best_alpha))
+        c = sqrt_w * a
+        # w = Xc^T c = X^T c - mean_w * sum(c), with the weighted mean X^T p
+        w = torch.cat(
+            [
+                chunk.T @ c - (chunk.T @ p) * c.sum()
+                for _, chunk in _feature_chunks(X, chunk_size, device)
+            ]
+        )
+        if cav_type == "lssvm":
+            logger.debug("Best gamma: %s", 1 / best_alpha)
+        else:
+            logger.debug("Best alpha: %s", best_alpha)
+
+    result = (
+        (w / w.norm())[None].float().cpu(),
+        mean_act_nonartif.float().cpu(),
+        mean_act_artif.float().cpu(),
+    )
+    if return_alpha:
+        return result + (best_alpha,)
+    return result
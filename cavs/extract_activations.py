@@ -2,8 +2,67 @@ import torch
 import torch.nn as nn
 import numpy as np
 import os
+import copy
+import hashlib
+import itertools
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+import torch.multiprocessing as mp
+from torch.utils.data import DataLoader, SequentialSampler, Subset
 from tqdm import tqdm
 
+from .activation_cache import ActivationCache, activation_cache_key
+from .activation_store import (
+    ActivationStore,
+    ActivationStoreWriter,
+    NpzActivations,
+    QUANTIZATION_KEY,
+    is_activation_store,
+    merge_stores,
+)
+from .extraction_pipeline import ExtractionPipeline
+from .metadata_buffer import MetadataBuffer
+from .profiling import profiled
+from .quantization import OFFSET_SUFFIX, SCALE_SUFFIX, QuantizationReport
+from .reducers import resolve_reducers
+from .sketch import Sketch
+
+logger = logging.getLogger(__name__)
+
+def _resolve_sketches(sketches, layer_names):
+    """
+    Map layer names to sketch templates; layers without a sketch are left out.
+    """
+    if sketches is None:
+        return {}
+    if isinstance(sketches, Sketch):
+        return {name: sketches for name in layer_names}
+    if isinstance(sketches, dict):
+        unknown = set(sketches) - set(layer_names)
+        if unknown:
+            raise ValueError(f"Sketches given for layers that are not hooked: {unknown}")
+        return {name: sketch for name, sketch in sketches.items() if sketch is not None}
+    raise ValueError("sketches must be None, a Sketch, or a dict of {name: Sketch}")
+
+
+def _dataset_length(dataloader, default=1024):
+    """
+    Number of samples the dataloader will yield, used to presize buffers.
+    """
+    try:
+        return len(dataloader.dataset)
+    except (AttributeError, TypeError):
+        return default
+
+
+def _num_batches(dataloader):
+    try:
+        return len(dataloader)
+    except TypeError:
+        return None
+
 
 def get_all_layers(model, prefix=""):
     """
@@ -44,14 +103,47 @@ def get_layer_by_name(model, layer_name):
 
 
 def load_activations(save_path):
-    activations_np = np.load(save_path)
-    activations = {}
-    for key in activations_np:
-        activations[key] = activations_np[key]
-    print(f"Loaded activations from '{save_path}'")
+    """
+    Open saved activations lazily.
+
+    Args:
+        save_path (str): Path to an ``.npz`` file or to an activation store directory.
+
+    Returns:
+        Mapping: Dict-like handle that reads a layer only when it is indexed.
+    """
+    if os.path.isdir(save_path):
+        activations = ActivationStore(save_path)
+    else:
+        activations = NpzActivations(save_path)
+    logger.info("Loaded activations from '%s'", save_path)
     return activations
 
 
+def _resolve_layers(model, layers):
+    """
+    Normalise the ``layers`` argument of ``extract_activations`` to a dict of {name: module}.
+    """
+    if layers is None:
+        return get_all_layers(model)
+    elif isinstance(layers, list):
+        layers_dict = {}
+        for name in layers:
+            try:
+                layer = get_layer_by_name(model, name)
+                layers_dict[name] = layer
+            except AttributeError:
+                raise ValueError(f"Layer '{name}' not found in the model.")
+        return layers_dict
+    elif isinstance(layers, dict):
+        return layers
+    else:
+        raise ValueError(
+            "layers must be None, a list of layer names, or a dict of {name: module}"
+        )
+
+
+@profiled("cavs.extract_activations")
 def extract_activations(
     model,
     dataloader,
@@ -60,6 +152,15 @@ def extract_activations(
     device="cuda",
     use_cache=True,
     save_dir="./activations",
+    streaming=False,
+    shard_size=4096,
+    reducers=None,
+    cache_max_bytes=None,
+    checkpoint_every=None,
+    async_write=False,
+    num_processes=1,
+    sketches=None,
+    storage_dtype=None,
 ):
     """
     Extract activations from all layers of a model for data from a dataloader.
@@ -72,84 +173,596 @@ def extract_activations(
                                          If None, all layers are used.
                                          Can be a list of layer names or a dict of {name: module}.
         device (str, optional): Device to run the model on ('cuda' or 'cpu').
-        use_cache (bool, optional): Whether to use cached activations if available.
+        use_cache (bool, optional): Whether to use cached activations if available. Cache
+                                    entries are keyed on a hash of the model weights,
+                                    the hooked layers, the reducers and a fingerprint
+                                    of the dataset, not on the experiment name.
+        save_dir (str, optional): Directory of the activation cache.
+        streaming (bool, optional): Write activations batch by batch to a sharded on-disk
+                                    store instead of collecting them in memory. Peak
+                                    memory is then bounded by a single batch.
+        shard_size (int, optional): Number of samples per shard file in streaming mode.
+        reducers (str, callable or dict, optional): Reducer applied to each layer output on
+                                    the device, inside the forward hook and before the
+                                    host copy, e.g. "gap", "gmp", "flatten" or a callable
+                                    from ``cavs.reducers``. A dict of {name: reducer}
+                                    reduces layers individually. Defaults to None (keep
+                                    full feature maps).
+        cache_max_bytes (int, optional): Size budget of the activation cache. Least
+                                    recently used entries are evicted once it is
+                                    exceeded. Defaults to None (unbounded).
+        checkpoint_every (int, optional): In streaming mode, commit the written shards
+                                    and a progress cursor every this many batches. A
+                                    later call with the same model, dataset, layers and
+                                    reducers (and use_cache=True) resumes after the last
+                                    committed batch. Defaults to None (no checkpoints).
+        async_write (bool, optional): In streaming mode, copy outputs into pinned host
+                                    buffers on a side CUDA stream and write them from a
+                                    background thread, overlapping compute, transfer and
+                                    disk I/O. Per-stage timings are logged and stored in
+                                    the store manifest either way. Defaults to False.
+        num_processes (int, optional): In streaming mode, split the dataset into this many
+                                    contiguous index ranges and extract them in separate
+                                    worker processes, each with its own model replica and
+                                    shard writer. The parts are stitched into one store
+                                    in dataset index order (the dataloader's sampler and
+                                    num_workers are not used). Model, dataset, collate_fn
+                                    and reducers must be picklable. Defaults to 1.
+        sketches (Sketch or dict, optional): In streaming mode, store k-dimensional codes of
+                                    the (reduced, flattened) layer outputs instead of the
+                                    outputs themselves, e.g. a ``RandomProjectionSketch``
+                                    or ``StreamingPCASketch`` from ``cavs.sketch``. A
+                                    single sketch is copied for every layer, a dict of
+                                    {name: sketch} sketches layers individually. The
+                                    fitted bases are saved with the store, see
+                                    ``ActivationStore.sketch``. Defaults to None.
+        storage_dtype (str, optional): Store activations in reduced precision: "float16",
+                                    "bfloat16", or "int8" with an affine scale per sample
+                                    and channel. Values are converted on the device and
+                                    dequantized to float32 transparently on load. The
+                                    relative reconstruction error per layer is logged
+                                    and saved. Defaults to None (keep the model's dtype).
 
     Returns:
-        dict: Dictionary mapping layer names to activations.
+        dict: Dictionary mapping layer names to activations. In streaming mode, a
+              read-only ActivationStore with the same interface.
     """
-    save_path = os.path.join(save_dir, experiment_name + ".npz")
+    if checkpoint_every is not None and not streaming:
+        raise ValueError("checkpoint_every requires streaming=True")
+    if num_processes > 1 and not streaming:
+        raise ValueError("num_processes > 1 requires streaming=True")
+
+    layers = _resolve_layers(model, layers)
+    layer_reducers = resolve_reducers(reducers, layers)
+    layer_sketches = _resolve_sketches(sketches, layers)
+
+    if layer_sketches:
+        if not streaming:
+            raise ValueError("sketches require streaming=True")
+        if (checkpoint_every is not None or num_processes > 1) and not all(
+            sketch.stateless for sketch in layer_sketches.values()
+        ):
+            raise ValueError(
+                "Data-dependent sketches cannot be combined with checkpoint_every "
+                "or num_processes > 1"
+            )
+
+    if storage_dtype is not None:
+        # Validate before running the extraction
+        QuantizationReport(storage_dtype)
+
+    cache = ActivationCache(save_dir, cache_max_bytes)
+    # Streaming stores a repeated module as name, name_1, ..., while the in-memory
+    # path concatenates its calls, or splits relu layers of "resnet" experiments
+    # into name_pre and name_post; each layout gets its own cache entry
+    key_config = {"streaming": streaming}
+    if not streaming and "resnet" in experiment_name:
+        key_config["split_relu"] = True
+    if layer_sketches:
+        key_config["sketches"] = {
+            name: sketch.config() for name, sketch in layer_sketches.items()
+        }
+    if storage_dtype is not None:
+        key_config["storage_dtype"] = storage_dtype
+    key = activation_cache_key(
+        model,
+        getattr(dataloader, "dataset", None),
+        layers,
+        layer_reducers,
+        **key_config,
+    )
+    if key is None:
+        logger.info("Dataset cannot be fingerprinted, activations will not be cached.")
+        key = hashlib.sha256(f"{experiment_name}:{time.time()}".encode()).hexdigest()
+    elif use_cache:
+        cached_path = cache.lookup(key)
+        if cached_path is not None:
+            return load_activations(cached_path)
+
+    save_path = cache.entry_path(key, experiment_name, streaming)
 
-    if use_cache and os.path.exists(save_path):
-        return load_activations(save_path)
     model.eval()
     model.to(device)
 
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-
     activations = {}
 
-    if layers is None:
-        layers = get_all_layers(model)
-    elif isinstance(layers, list):
-        layers_dict = {}
-        for name in layers:
-            try:
-                layer = get_layer_by_name(model, name)
-                layers_dict[name] = layer
-            except AttributeError:
-                raise ValueError(f"Layer '{name}' not found in the model.")
-        layers = layers_dict
-    elif isinstance(layers, dict):
-        pass
-    else:
-        raise ValueError(
-            "layers must be None, a list of layer names, or a dict of {name: module}"
+    if streaming and num_processes > 1:
+        result = _extract_activations_parallel(
+            model,
+            dataloader,
+            layers,
+            layer_reducers,
+            device,
+            save_path,
+            shard_size,
+            key,
+            checkpoint_every,
+            use_cache,
+            async_write,
+            num_processes,
+            layer_sketches,
+            storage_dtype,
+        )
+        cache.add(key, save_path, experiment_name)
+        return result
+
+    if streaming:
+        result = _extract_activations_streaming(
+            model,
+            dataloader,
+            layers,
+            layer_reducers,
+            device,
+            save_path,
+            shard_size,
+            key,
+            checkpoint_every,
+            resume=use_cache,
+            async_write=async_write,
+            layer_sketches=layer_sketches,
+            storage_dtype=storage_dtype,
         )
+        cache.add(key, save_path, experiment_name)
+        return result
+
+    report = QuantizationReport(storage_dtype) if storage_dtype is not None else None
 
     handles = []
     for name, layer in layers.items():
 
         def get_activation(name):
             def hook(model, input, output):
-                if name not in activations:
-                    activations[name] = []
-                activations[name].append(output.detach().cpu())
+                output = _reduce(output, layer_reducers[name])
+                stored = {"": output} if report is None else report.quantize(name, output)
+                for suffix, values in stored.items():
+                    activations.setdefault(name + suffix, []).append(values.cpu())
 
             return hook
 
         handle = layer.register_forward_hook(get_activation(name))
         handles.append(handle)
 
-    labels_np = np.array([]).reshape(-1, 2)
+    metadata = MetadataBuffer(_dataset_length(dataloader))
     with torch.no_grad():
         for batch_idx, batch in enumerate(
             tqdm(dataloader, desc="Extracting Activations")
         ):
             data = batch[0]
+            metadata.append(batch[1:], len(data))
 
-            rest = np.array(batch[1:]).reshape(-1, len(batch[1:]))
-
-            labels_np = np.concatenate((labels_np, rest), axis=0)
             data = data.to(device)
             _ = model(data)
 
     for handle in handles:
         handle.remove()
 
-    activations_np = {}
-    activations_np["labels"] = labels_np
-    for name, acts in activations.items():
-        np_acts = torch.cat(acts).cpu().numpy()
-        if (
+    activations_np = metadata.to_dict("labels")
+    split_layers = set()
+    for name in layers:
+        if name not in activations:
+            continue
+        split = (
             "resnet" in experiment_name
             and "relu" in name.lower()
-            and np_acts.shape[0] == len(labels_np) // 2
-        ):
-            activations_np[name + "_pre"] = np_acts[: len(labels_np) // 2]
-            activations_np[name + "_post"] = np_acts[len(labels_np) // 2 :]
-        else:
-            activations_np[name] = np_acts
+            and sum(len(a) for a in activations[name]) == len(metadata) // 2
+        )
+        # int8 scales and offsets are split along with the values they belong to
+        for suffix in ("", SCALE_SUFFIX, OFFSET_SUFFIX):
+            if name + suffix not in activations:
+                continue
+            np_acts = torch.cat(activations[name + suffix]).cpu().numpy()
+            if split:
+                activations_np[name + "_pre" + suffix] = np_acts[: len(metadata) // 2]
+                activations_np[name + "_post" + suffix] = np_acts[len(metadata) // 2 :]
+            else:
+                activations_np[name + suffix] = np_acts
+        if split:
+            split_layers.add(name)
+
+    if report is not None:
+        manifest = report.manifest()
+        for name in split_layers:
+            entry = manifest.pop(name)
+            manifest[name + "_pre"] = manifest[name + "_post"] = entry
+        activations_np[QUANTIZATION_KEY] = np.array(json.dumps(manifest))
+        logger.debug("%s", report.summary())
+
     np.savez(save_path, **activations_np)
-    print(f"Saved all activations at '{save_path}'")
+    cache.add(key, save_path, experiment_name)
+    logger.info("Saved all activations at '%s'", save_path)
+    if report is not None:
+        # Hand out dequantized values, as a later cache hit would
+        return load_activations(save_path)
     return activations_np
+
+
+def _reduce(output, reducer):
+    output = output.detach()
+    if reducer is not None:
+        output = reducer(output).contiguous()
+    return output
+
+
+PROGRESS_NAME = "progress.json"
+PROGRESS_METADATA_NAME = "progress_metadata.npz"
+
+
+def _write_checkpoint(save_path, key, writer, metadata, batches_done, report=None):
+    """
+    Commit everything written so far. progress.json is replaced last and atomically,
+    so it only ever points at data that is already on disk.
+    """
+    writer.flush()
+
+    columns = metadata.to_dict("labels")
+    np.savez(
+        os.path.join(save_path, "tmp_" + PROGRESS_METADATA_NAME),
+        **{k: v for k, v in columns.items() if k != "labels"},
+    )
+    os.replace(
+        os.path.join(save_path, "tmp_" + PROGRESS_METADATA_NAME),
+        os.path.join(save_path, PROGRESS_METADATA_NAME),
+    )
+
+    progress = {
+        "key": key,
+        "shard_size": writer.shard_size,
+        "batches_done": batches_done,
+        "samples_done": len(metadata),
+        "layers": writer.state(),
+    }
+    if report is not None:
+        progress["quantization"] = report.state()
+    tmp_path = os.path.join(save_path, "tmp_" + PROGRESS_NAME)
+    with open(tmp_path, "w") as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, os.path.join(save_path, PROGRESS_NAME))
+
+
+def _read_checkpoint(save_path, key, shard_size):
+    """
+    Load the last committed progress of an interrupted extraction, if it matches.
+    """
+    progress_path = os.path.join(save_path, PROGRESS_NAME)
+    if not os.path.exists(progress_path):
+        return None
+
+    with open(progress_path) as f:
+        progress = json.load(f)
+
+    # Model, dataset, layers and reducers must be unchanged
+    if progress["key"] != key or progress["shard_size"] != shard_size:
+        logger.info(
+            "Discarding checkpoint at '%s': fingerprints do not match.", save_path
+        )
+        return None
+
+    with np.load(os.path.join(save_path, PROGRESS_METADATA_NAME)) as npz:
+        n_columns = len(npz.files)
+        progress["columns"] = [
+            npz[f"labels_{i}"][: progress["samples_done"]] for i in range(n_columns)
+        ]
+    return progress
+
+
+def _remove_checkpoint(save_path):
+    for name in (PROGRESS_NAME, PROGRESS_METADATA_NAME):
+        path = os.path.join(save_path, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _skip_batches(dataloader, batches_done, samples_done):
+    """
+    Iterate a dataloader from a given batch on, without loading the skipped samples
+    when the dataloader reads a map-style dataset in order.
+    """
+    if batches_done == 0:
+        return dataloader
+
+    if isinstance(dataloader.sampler, SequentialSampler) and dataloader.batch_size:
+        dataset = dataloader.dataset
+        return DataLoader(
+            Subset(dataset, range(samples_done, len(dataset))),
+            batch_size=dataloader.batch_size,
+            num_workers=dataloader.num_workers,
+            collate_fn=dataloader.collate_fn,
+            pin_memory=dataloader.pin_memory,
+            drop_last=dataloader.drop_last,
+        )
+    return itertools.islice(dataloader, batches_done, None)
+
+
+def _extract_activations_streaming(
+    model,
+    dataloader,
+    layers,
+    layer_reducers,
+    device,
+    save_path,
+    shard_size,
+    key=None,
+    checkpoint_every=None,
+    resume=True,
+    async_write=False,
+    layer_sketches=None,
+    storage_dtype=None,
+):
+    """
+    Streaming counterpart of the extraction loop in ``extract_activations``.
+
+    Every hooked output is written straight into an ``ActivationStoreWriter``. If a
+    module is called several times per forward pass (e.g. a shared ReLU), the k-th
+    call (k >= 1) is stored under ``f"{name}_{k}"``.
+    """
+    layer_sketches = layer_sketches or {}
+    active_sketches = {}
+    report = QuantizationReport(storage_dtype) if storage_dtype is not None else None
+
+    def emit(store_key, values):
+        if report is None:
+            pipeline.add(store_key, values)
+            return
+        for suffix, stored in report.quantize(store_key, values).items():
+            pipeline.add(store_key + suffix, stored)
+
+    num_samples = _dataset_length(dataloader, default=None)
+    metadata = MetadataBuffer(num_samples or 1024)
+
+    progress = None
+    if checkpoint_every is not None and resume:
+        progress = _read_checkpoint(save_path, key, shard_size)
+
+    if progress is not None:
+        writer = ActivationStoreWriter.resume(
+            save_path, progress["layers"], shard_size, num_samples
+        )
+        metadata.append(progress["columns"], progress["samples_done"])
+        batches_done = progress["batches_done"]
+        if report is not None and "quantization" in progress:
+            report.load_state(progress["quantization"])
+        logger.info(
+            "Resuming extraction after batch %d from '%s'", batches_done, save_path
+        )
+    else:
+        writer = ActivationStoreWriter(save_path, shard_size, num_samples)
+        batches_done = 0
+
+    pipeline = ExtractionPipeline(writer, threaded=async_write)
+    timings = pipeline.timings
+    calls = {}
+
+    handles = []
+    for name, layer in layers.items():
+
+        def get_activation(name):
+            def hook(model, input, output):
+                k = calls.get(name, 0)
+                calls[name] = k + 1
+                store_key = name if k == 0 else f"{name}_{k}"
+                output = _reduce(output, layer_reducers[name])
+
+                if name not in layer_sketches:
+                    emit(store_key, output)
+                    return
+                if store_key not in active_sketches:
+                    active_sketches[store_key] = copy.deepcopy(layer_sketches[name])
+                for codes in active_sketches[store_key].push(output):
+                    emit(store_key, codes)
+
+            return hook
+
+        handle = layer.register_forward_hook(get_activation(name))
+        handles.append(handle)
+
+    try:
+        with torch.no_grad():
+            batches = tqdm(
+                _skip_batches(dataloader, batches_done, len(metadata)),
+                desc="Extracting Activations",
+                initial=batches_done,
+                total=_num_batches(dataloader),
+            )
+            start = time.perf_counter()
+            for batch_idx, batch in enumerate(batches, start=batches_done):
+                timings["data"] += time.perf_counter() - start
+
+                data = batch[0]
+                metadata.append(batch[1:], len(data))
+
+                calls.clear()
+                start, transfer = time.perf_counter(), timings["transfer"]
+                data = data.to(device)
+                _ = model(data)
+                # Synchronous host copies inside the hooks are counted as transfer
+                timings["compute"] += (time.perf_counter() - start) - (
+                    timings["transfer"] - transfer
+                )
+                pipeline.submit()
+
+                if checkpoint_every is not None and (batch_idx + 1) % checkpoint_every == 0:
+                    pipeline.drain()
+                    _write_checkpoint(
+                        save_path, key, writer, metadata, batch_idx + 1, report
+                    )
+                start = time.perf_counter()
+
+            # Emit samples still buffered by data-dependent sketches
+            for store_key, sketch in active_sketches.items():
+                for codes in sketch.finish():
+                    emit(store_key, codes)
+            pipeline.submit()
+    finally:
+        for handle in handles:
+            handle.remove()
+        pipeline.close()
+
+    for column_name, values in metadata.to_dict("labels").items():
+        writer.append(column_name, values)
+
+    sketch_entries = {}
+    for store_key, sketch in active_sketches.items():
+        file_name = f"sketch_{store_key}.npz"
+        np.savez(os.path.join(save_path, file_name), **sketch.state())
+        sketch_entries[store_key] = {"config": sketch.config(), "file": file_name}
+
+    extra = {"timings": dict(timings), "sketches": sketch_entries}
+    if report is not None:
+        extra["quantization"] = report.manifest()
+        logger.debug("%s", report.summary())
+
+    writer.close(extra=extra)
+    _remove_checkpoint(save_path)
+    logger.debug("%s", pipeline.summary())
+    logger.info("Saved all activations at '%s'", save_path)
+    return ActivationStore(save_path)
+
+
+def _extract_part(
+    model,
+    dataset,
+    start,
+    stop,
+    loader_kwargs,
+    layer_paths,
+    layer_reducers,
+    device,
+    part_path,
+    shard_size,
+    key,
+    checkpoint_every,
+    resume,
+    async_write,
+    num_threads,
+    layer_sketches,
+    storage_dtype,
+):
+    """
+    Worker of ``_extract_activations_parallel``: extract samples [start, stop).
+    """
+    torch.set_num_threads(num_threads)
+    model.eval()
+    model.to(device)
+    layers = {name: get_layer_by_name(model, path) for name, path in layer_paths.items()}
+    dataloader = DataLoader(Subset(dataset, range(start, stop)), **loader_kwargs)
+
+    store = _extract_activations_streaming(
+        model,
+        dataloader,
+        layers,
+        layer_reducers,
+        device,
+        part_path,
+        shard_size,
+        f"{key}:{start}-{stop}",
+        checkpoint_every,
+        resume,
+        async_write,
+        layer_sketches,
+        storage_dtype,
+    )
+    return store.manifest.get("timings")
+
+
+def _extract_activations_parallel(
+    model,
+    dataloader,
+    layers,
+    layer_reducers,
+    device,
+    save_path,
+    shard_size,
+    key,
+    checkpoint_every,
+    resume,
+    async_write,
+    num_processes,
+    layer_sketches,
+    storage_dtype,
+):
+    """
+    Data-parallel counterpart of ``_extract_activations_streaming``.
+
+    Every worker process writes a complete store for its index range into
+    ``save_path/part_<i>``; the parts are then merged into ``save_path`` by reference.
+    """
+    dataset = dataloader.dataset
+    num_samples = len(dataset)
+    num_processes = max(1, min(num_processes, num_samples))
+    bounds = np.linspace(0, num_samples, num_processes + 1).astype(int)
+
+    # Hooks are registered in the replicas, so pass module paths instead of modules
+    module_paths = {id(module): path for path, module in model.named_modules()}
+    layer_paths = {name: module_paths[id(module)] for name, module in layers.items()}
+
+    loader_kwargs = {
+        "batch_size": dataloader.batch_size,
+        "collate_fn": dataloader.collate_fn,
+        "drop_last": dataloader.drop_last,
+    }
+    num_threads = max(1, (os.cpu_count() or 1) // num_processes)
+
+    os.makedirs(save_path, exist_ok=True)
+    if is_activation_store(save_path):
+        os.remove(os.path.join(save_path, "manifest.json"))
+
+    # Workers receive a CPU copy; move the caller's model back afterwards
+    original_device = next(
+        itertools.chain(model.parameters(), model.buffers()), torch.empty(0)
+    ).device
+    model.cpu()
+    part_paths = [os.path.join(save_path, f"part_{i}") for i in range(num_processes)]
+    try:
+        with ProcessPoolExecutor(
+            max_workers=num_processes, mp_context=mp.get_context("spawn")
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _extract_part,
+                    model,
+                    dataset,
+                    int(bounds[i]),
+                    int(bounds[i + 1]),
+                    loader_kwargs,
+                    layer_paths,
+                    layer_reducers,
+                    device,
+                    part_paths[i],
+                    shard_size,
+                    key,
+                    checkpoint_every,
+                    resume,
+                    async_write,
+                    num_threads,
+                    layer_sketches,
+                    storage_dtype,
+                )
+                for i in range(num_processes)
+            ]
+            part_timings = [future.result() for future in futures]
+    finally:
+        model.to(original_device)
+
+    merge_stores(save_path, part_paths, extra={"timings": part_timings})
+    logger.info("Merged %d parts into '%s'", num_processes, save_path)
+    return ActivationStore(save_path)
@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+
+import torch
+
+from .activation_store import ActivationStoreWriter
+
+
+class ExtractionPipeline:
+    """
+    Moves hooked layer outputs from the device to an ``ActivationStoreWriter``.
+
+    With ``threaded=True`` outputs of CUDA layers are copied asynchronously on a
+    separate stream into pinned, reusable host buffers, and completed batches are
+    handed to a background thread that waits for the copies and writes them to disk.
+    Kernels after a hooked layer wait on the device for its copy, which may still be
+    reading the output, but the host never blocks, so data loading, kernel launches,
+    device-to-host copies and disk I/O overlap. At most
+    ``max_pending`` batches are queued, which bounds the host memory in use.
+
+    With ``threaded=False`` every batch is copied and written synchronously.
+
+    Per-stage wall times are accumulated in ``timings``:
+        - "data": waiting for the dataloader
+        - "compute": the forward pass as seen from the host, including the hooks
+        - "transfer": waiting for device-to-host copies
+        - "write": appending to the on-disk store
+
+    Args:
+        writer (ActivationStoreWriter): Store to write to.
+        threaded (bool): Whether to copy and write in the background.
+        max_pending (int): Maximum number of batches queued for the writer thread.
+    """
+
+    def __init__(
+        self, writer: ActivationStoreWriter, threaded: bool = True, max_pending: int = 2
+    ) -> None:
+        self.writer = writer
+        self.threaded = threaded
+        self.timings = {"data": 0.0, "compute": 0.0, "transfer": 0.0, "write": 0.0}
+        self._batch = []
+        self._free_buffers = {}
+        self._lock = threading.Lock()
+        self._error = None
+        self._copy_stream = None
+
+        if threaded:
+            self._queue = queue.Queue(maxsize=max_pending)
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _acquire_buffer(self, tensor: torch.Tensor) -> torch.Tensor:
+        key = (tuple(tensor.shape), tensor.dtype)
+        with self._lock:
+            free = self._free_buffers.setdefault(key, [])
+            if free:
+                return free.pop()
+        return torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+
+    def _release_buffer(self, buffer: torch.Tensor) -> None:
+        with self._lock:
+            self._free_buffers[(tuple(buffer.shape), buffer.dtype)].append(buffer)
+
+    def add(self, name: str, output: torch.Tensor) -> None:
+        """
+        Queue one hooked output of the current batch for the host copy.
+
+        Args:
+            name (str): Key to store the output under.
+            output (torch.Tensor): Detached (and possibly reduced) layer output.
+        """
+        if not (self.threaded and output.is_cuda):
+            start = time.perf_counter()
+            host = output.cpu()
+            self.timings["transfer"] += time.perf_counter() - start
+            self._batch.append((name, host, None, None))
+            return
+
+        if self._copy_stream is None:
+            self._copy_stream = torch.cuda.Stream(device=output.device)
+
+        buffer = self._acquire_buffer(output)
+        compute_stream = torch.cuda.current_stream(output.device)
+        # Copy on a side stream once the layer output is ready, so the host does not
+        # wait for the transfer
+        self._copy_stream.wait_stream(compute_stream)
+        with torch.cuda.stream(self._copy_stream):
+            buffer.copy_(output, non_blocking=True)
+            event = torch.cuda.Event()
+            event.record(self._copy_stream)
+        # Later kernels, e.g. an in-place ReLU, must not overwrite the output while
+        # it is still being copied
+        compute_stream.wait_event(event)
+        self._batch.append((name, buffer, event, buffer))
+
+    def submit(self) -> None:
+        """
+        Hand all outputs added since the last call to the writer.
+        """
+        batch, self._batch = self._batch, []
+        if self.threaded:
+            self._check_error()
+            self._queue.put(batch)
+        else:
+            self._write(batch)
+
+    def _write(self, batch: list) -> None:
+        for name, host, event, buffer in batch:
+            if event is not None:
+                start = time.perf_counter()
+                event.synchronize()
+                self.timings["transfer"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            self.writer.append(name, host.numpy())
+            self.timings["write"] += time.perf_counter() - start
+
+            if buffer is not None:
+                self._release_buffer(buffer)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    return
+                if self._error is None:
+                    self._write(batch)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _check_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("Background activation writer failed") from self._error
+
+    def drain(self) -> None:
+        """
+        Block until every submitted batch has been written.
+        """
+        if self.threaded:
+            self._queue.join()
+            self._check_error()
+
+    def close(self) -> None:
+        """
+        Write all pending batches and stop the writer thread.
+        """
+        if self.threaded:
+            self._queue.put(None)
+            self._thread.join()
+            self._check_error()
+
+    def summary(self) -> str:
+        """
+        One-line report of the per-stage timings.
+        """
+        total = sum(self.timings.values()) or 1.0
+        stages = ", ".join(
+            f"{stage} {seconds:.2f}s ({100 * seconds / total:.0f}%)"
+            for stage, seconds in self.timings.items()
+        )
+        bottleneck = max(self.timings, key=self.timings.get)
+        return f"Extraction timings: {stages} -> {bottleneck}-bound"
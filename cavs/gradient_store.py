@@ -0,0 +1,207 @@
+import logging
+import os
+
+import numpy as np
+import torch
+from torch import nn
+from tqdm import tqdm
+
+from .activation_cache import activation_cache_key, describe_callable
+from .activation_store import ActivationStore, ActivationStoreWriter, is_activation_store
+from .reducers import get_reducer
+from .tcav import (
+    compute_activation_gradients,
+    prepare_model,
+    process_cavs,
+    register_activation_hook,
+    tcav_result,
+)
+
+logger = logging.getLogger(__name__)
+
+# Name of the gradient "layer" in a gradient store
+GRADIENTS_KEY = "gradients"
+GRADIENT_STORAGE_DTYPES = ("float32", "float16")
+
+
+def save_activation_gradients(
+    model: nn.Module,
+    dataloader: torch.utils.data.DataLoader,
+    target_layer: str,
+    target_class: int,
+    save_dir: str = "./gradients",
+    device: str = "cuda",
+    num_samples: int | None = None,
+    reducer=None,
+    storage_dtype: str = "float32",
+    shard_size: int = 4096,
+    use_cache: bool = True,
+    gradient_mode: str = "truncated",
+) -> ActivationStore:
+    """
+    Run one TCAV gradient pass and persist the per-sample activation gradients.
+
+    The raw (unnormalised) gradients of ``target_class`` with respect to the output
+    of ``target_layer`` are written to a memory-mapped ``ActivationStore`` under
+    ``GRADIENTS_KEY``, so any number of CAVs can later be scored with
+    ``score_stored_gradients`` without running the model again. Stores are keyed by
+    the model weights, dataset, layer, class and settings, and reused when the same
+    pass is requested again.
+
+    Args:
+        model (nn.Module): The PyTorch model to analyze.
+        dataloader (torch.utils.data.DataLoader): DataLoader providing the dataset to evaluate.
+        target_layer (str): The name of the layer from which to extract activation gradients.
+        target_class (int): The index of the target class.
+        save_dir (str): Directory holding the gradient stores.
+        device (str): Device to perform computations on ('cuda' or 'cpu').
+        num_samples (int, optional): Number of samples to store (default: all).
+        reducer (str or callable, optional): Reducer applied to the gradients, see
+            ``cavs.reducers``. It must match the reducer of the activations the CAVs
+            are fitted on, e.g. "gap" for CAVs on pooled activations.
+        storage_dtype (str): "float32" or "float16".
+        shard_size (int): Number of samples per shard file.
+        use_cache (bool): Reuse a complete store of the same pass if there is one.
+        gradient_mode (str): "truncated" or "full", see
+            ``cavs.tcav.compute_activation_gradients``.
+
+    Returns:
+        ActivationStore: Store holding the gradients of shape (num_samples, ...).
+    """
+    if storage_dtype not in GRADIENT_STORAGE_DTYPES:
+        raise ValueError(
+            f"Unknown storage dtype '{storage_dtype}'. "
+            f"Use one of {GRADIENT_STORAGE_DTYPES}."
+        )
+    reducer = get_reducer(reducer)
+
+    key = activation_cache_key(
+        model,
+        getattr(dataloader, "dataset", None),
+        [target_layer],
+        {target_layer: reducer},
+        target_class=target_class,
+        num_samples=num_samples,
+        storage_dtype=storage_dtype,
+        kind=GRADIENTS_KEY,
+    )
+    if key is None:
+        raise ValueError("Dataset cannot be fingerprinted, gradients cannot be stored.")
+
+    store_dir = os.path.join(save_dir, f"gradients_{target_layer}_{key[:16]}")
+    if use_cache and is_activation_store(store_dir):
+        logger.info("Loaded gradients from '%s'", store_dir)
+        return ActivationStore(store_dir)
+
+    model = prepare_model(model, device)
+    activations = {}
+    hook_handle = register_activation_hook(
+        model, target_layer, activations, truncate=gradient_mode == "truncated"
+    )
+
+    writer = ActivationStoreWriter(store_dir, shard_size, num_samples)
+    total = 0
+    try:
+        for batch in tqdm(dataloader, desc="Storing Activation Gradients"):
+            if num_samples is not None and total >= num_samples:
+                break
+
+            inputs = batch[0] if isinstance(batch, (list, tuple)) else batch
+            if num_samples is not None:
+                inputs = inputs[: num_samples - total]
+            inputs = inputs.to(device)
+
+            grad = compute_activation_gradients(
+                model, inputs, activations, target_class, gradient_mode
+            ).detach()
+            if reducer is not None:
+                grad = reducer(grad)
+
+            grad = grad.to(getattr(torch, storage_dtype)).cpu().numpy()
+            writer.append(GRADIENTS_KEY, grad)
+            total += inputs.size(0)
+    finally:
+        hook_handle.remove()
+
+    writer.close(
+        extra={
+            "gradients": {
+                "target_layer": target_layer,
+                "target_class": target_class,
+                "reducer": describe_callable(reducer),
+                "storage_dtype": storage_dtype,
+            }
+        }
+    )
+    logger.info("Saved %d activation gradients at '%s'", total, store_dir)
+    return ActivationStore(store_dir)
+
+
+def iter_gradient_blocks(gradients: ActivationStore | str, batch_size: int = 4096):
+    """
+    Yield the stored gradients as float32 blocks of at most ``batch_size`` rows.
+
+    Shards are read memory-mapped one block at a time, so stores larger than memory
+    can be scanned.
+    """
+    if isinstance(gradients, str):
+        gradients = ActivationStore(gradients)
+
+    layer = gradients.manifest["layers"][GRADIENTS_KEY]
+    for shard in layer["shards"]:
+        values = np.load(
+            os.path.join(gradients.store_dir, shard["file"]), mmap_mode="r"
+        )[: shard["rows"]]
+        for start in range(0, len(values), batch_size):
+            block = values[start : start + batch_size]
+            yield np.array(block, dtype=np.float32).reshape(len(block), -1)
+
+
+def score_stored_gradients(
+    gradients: ActivationStore | str,
+    cavs: np.ndarray | torch.Tensor,
+    batch_size: int = 4096,
+    device: str = "cpu",
+    return_derivatives: bool = False,
+) -> tuple:
+    """
+    Compute TCAV scores of one or more CAVs from stored activation gradients.
+
+    This is a streaming matrix product of the stored gradients with the CAVs, with
+    the same outputs as ``get_tcav_scores`` for the stored layer and class.
+
+    Args:
+        gradients (ActivationStore or str): Store from ``save_activation_gradients``,
+            or its directory.
+        cavs (np.ndarray or torch.Tensor): CAV of shape (n_features,) or
+            (1, n_features), or a stack of CAVs of shape (n_cavs, n_features) with
+            n_cavs > 1.
+        batch_size (int): Number of gradients read at a time.
+        device (str): Device to compute the products on.
+        return_derivatives (bool): Also return the directional derivatives.
+
+    Returns:
+        tuple: (tcav_score, tcav_positive, tcav_total), plus the directional
+            derivatives with ``return_derivatives``, as in ``get_tcav_scores``.
+    """
+    stacked = cavs.ndim == 2 and cavs.shape[0] > 1
+    cavs = process_cavs(cavs, device)
+
+    tcav_positive = torch.zeros(len(cavs), dtype=torch.long)
+    tcav_total = 0
+    derivatives = []
+    for block in iter_gradient_blocks(gradients, batch_size):
+        block = torch.from_numpy(block).to(device)
+        if block.size(1) != cavs.size(1):
+            raise ValueError("Dimension mismatch between gradients and CAV.")
+
+        # The sign of the alignment does not depend on the gradient norm
+        projections = block @ cavs.T
+        if return_derivatives:
+            derivatives.append(projections.cpu())
+        tcav_positive += (projections > 0).sum(0).cpu()
+        tcav_total += len(block)
+
+    return tcav_result(
+        tcav_positive, tcav_total, derivatives, stacked, return_derivatives
+    )
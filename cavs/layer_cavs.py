@@ -0,0 +1,174 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from .activation_store import ActivationStore, NpzActivations
+from .cav import compute_cav
+from .dual_cav import compute_cav_dual
+from .mass_mean_probe import compute_mass_mean_probe
+from .profiling import span
+
+logger = logging.getLogger(__name__)
+
+
+def fit_cav(vecs, targets: np.ndarray, cav_type: str, device: str = "cpu") -> tuple:
+    """
+    Dispatch to the CAV solver selected by ``cav_type``.
+
+    Args:
+        vecs (np.ndarray): Activations of shape (n_samples, n_features).
+        targets (np.ndarray): Binary targets of shape (n_samples,).
+        cav_type (str): "mmp", "dual_ridge", "dual_lssvm", "dual_signal" or a type of
+            ``compute_cav``.
+        device (str): Device of the dual solvers.
+
+    Returns:
+        tuple: (cav, mean_act_nonartif, mean_act_artif)
+    """
+    with span("cavs.fit_cav", cav_type=cav_type, activations=vecs):
+        match cav_type:
+            case "mmp":
+                return compute_mass_mean_probe(vecs, targets)
+            case "dual_ridge" | "dual_lssvm" | "dual_signal":
+                return compute_cav_dual(
+                    vecs, targets, cav_type.removeprefix("dual_"), device=device
+                )
+            case _:
+                return compute_cav(vecs, targets, cav_type)
+
+
+def _open_activations(source):
+    """
+    Re-open activations in a worker; stored layers are memory-mapped, not copied.
+    """
+    if isinstance(source, str):
+        return ActivationStore(source) if os.path.isdir(source) else NpzActivations(source)
+    return source
+
+
+def _fit_layer(source, layer, targets, cav_type, train_idx, test_idx, num_threads):
+    torch.set_num_threads(num_threads)
+    activations = _open_activations(source)
+
+    X = activations[layer]
+    if isinstance(X, torch.Tensor):
+        X = X.numpy()
+    X = X.reshape(len(X), -1)
+
+    start = time.perf_counter()
+    cav, mean_na, mean_a = fit_cav(X[train_idx], targets[train_idx], cav_type)
+    fit_time = time.perf_counter() - start
+
+    # Separability of the held-out samples along the CAV
+    scores = X[test_idx] @ cav.flatten().numpy().astype(X.dtype)
+    auc = roc_auc_score(targets[test_idx], scores)
+
+    # Map CAVs fitted on sketched activations back to the full activation space
+    if layer in getattr(activations, "manifest", {}).get("sketches", {}):
+        sketch = activations.sketch(layer)
+        cav = sketch.lift(cav)
+        cav = cav / cav.norm()
+        mean_na = sketch.inverse_transform(mean_na)
+        mean_a = sketch.inverse_transform(mean_a)
+
+    return {
+        "cav": cav.float(),
+        "mean_act_na": mean_na.float(),
+        "mean_act_a": mean_a.float(),
+        "fit_time": fit_time,
+        "auc": float(auc),
+    }
+
+
+def fit_layer_cavs(
+    activations,
+    layers: list[str],
+    targets: np.ndarray,
+    cav_type: str = "svm",
+    num_processes: int = 1,
+    test_size: float = 0.2,
+    seed: int = 0,
+) -> dict:
+    """
+    Fit a CAV on every candidate layer, e.g. to choose ``cav_layer``.
+
+    Layers are fitted in a pool of worker processes. Activation stores and ``.npz``
+    files are re-opened in every worker and read through memory maps, in-memory arrays
+    are moved to shared memory once, so no activations are pickled. Every CAV is fitted
+    on the same stratified training split and scored on the held-out samples by the
+    ROC AUC of the projections onto the CAV.
+
+    Args:
+        activations (Mapping): Activations as returned by ``extract_activations``.
+        layers (list): Names of the layers to fit CAVs on.
+        targets (np.ndarray): Binary targets of shape (n_samples,).
+        cav_type (str): CAV type, see ``fit_cav``.
+        num_processes (int): Number of worker processes.
+        test_size (float): Fraction of held-out samples.
+        seed (int): Seed of the train/test split.
+
+    Returns:
+        dict: Dictionary mapping layer names to a dict with "cav", "mean_act_na",
+              "mean_act_a", "fit_time" (seconds) and "auc" (held-out ROC AUC).
+    """
+    targets = np.asarray(targets)
+    train_idx, test_idx = train_test_split(
+        np.arange(len(targets)), test_size=test_size, stratify=targets, random_state=seed
+    )
+
+    if isinstance(activations, ActivationStore):
+        source = activations.store_dir
+    elif isinstance(activations, NpzActivations):
+        source = activations.path
+    elif num_processes > 1:
+        source = {
+            layer: torch.as_tensor(np.asarray(activations[layer])).share_memory_()
+            for layer in layers
+        }
+    else:
+        source = activations
+
+    table = {}
+    if num_processes <= 1:
+        for layer in layers:
+            table[layer] = _fit_layer(
+                source,
+                layer,
+                targets,
+                cav_type,
+                train_idx,
+                test_idx,
+                torch.get_num_threads(),
+            )
+    else:
+        num_threads = max(1, (os.cpu_count() or 1) // num_processes)
+        with ProcessPoolExecutor(
+            max_workers=num_processes, mp_context=mp.get_context("spawn")
+        ) as executor:
+            futures = {
+                layer: executor.submit(
+                    _fit_layer,
+                    source if isinstance(source, str) else {layer: source[layer]},
+                    layer,
+                    targets,
+                    cav_type,
+                    train_idx,
+                    test_idx,
+                    num_threads,
+                )
+                for layer in layers
+            }
+            table = {layer: future.result() for layer, future in futures.items()}
+
+    for layer, row in table.items():
+        logger.info(
+            "%s: held-out AUC %.3f, fit %.2fs", layer, row["auc"], row["fit_time"]
+        )
+    return table
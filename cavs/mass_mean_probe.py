@@ -1,6 +1,152 @@
 import numpy as np
 import torch
 
+from .cav_statistics import (
+    _as_batch,
+    accumulate_from_activations,
+    accumulate_from_dataloader,
+)
+
+
+class StreamingMassMeanProbe:
+    """
+    One-pass per-class mean activations for any number of classes or groups.
+
+    Batches are consumed with ``update``; counts and sums are accumulated in float64,
+    so the whole matrix is never needed in memory and no class subsets are copied.
+    Accumulators of different workers or data parts are combined with ``merge``.
+
+    Args:
+        device (str): Device the sums are accumulated on.
+    """
+
+    def __init__(self, device: str = "cpu") -> None:
+        self.device = device
+        self.classes = []
+        self.counts = torch.zeros(0, dtype=torch.float64, device=device)
+        self.sums = None
+
+    def _class_indices(self, labels: list, num_features: int) -> list[int]:
+        new = [label for label in labels if label not in self.classes]
+        if self.sums is None:
+            self.sums = torch.zeros(0, num_features, dtype=torch.float64, device=self.device)
+        if new:
+            self.classes.extend(new)
+            self.counts = torch.cat([self.counts, self.counts.new_zeros(len(new))])
+            self.sums = torch.cat([self.sums, self.sums.new_zeros(len(new), num_features)])
+        return [self.classes.index(label) for label in labels]
+
+    def update(self, x: np.ndarray | torch.Tensor, groups: np.ndarray | torch.Tensor) -> None:
+        """
+        Add a batch of activations of shape (N, ...) with class labels of shape (N,).
+        """
+        x = _as_batch(x, self.device)
+        labels, inverse = np.unique(np.asarray(groups), return_inverse=True)
+        index = torch.as_tensor(
+            self._class_indices(labels.tolist(), x.shape[1]), device=self.device
+        )[torch.as_tensor(inverse.reshape(-1), device=self.device)]
+
+        self.sums.index_add_(0, index, x)
+        self.counts.index_add_(0, index, torch.ones_like(index, dtype=torch.float64))
+
+    def merge(self, other: "StreamingMassMeanProbe") -> "StreamingMassMeanProbe":
+        """
+        Add the sums of another accumulator, e.g. of another worker, in place.
+        """
+        if other.sums is None:
+            return self
+        index = torch.as_tensor(
+            self._class_indices(other.classes, other.sums.shape[1]), device=self.device
+        )
+        self.sums.index_add_(0, index, other.sums.to(self.device))
+        self.counts.index_add_(0, index, other.counts.to(self.device))
+        return self
+
+    def means(self) -> dict:
+        """
+        Mean activation (float64) of every class.
+        """
+        return {c: self.sums[i] / self.counts[i] for i, c in enumerate(self.classes)}
+
+    def probes(self, mode: str = "pairwise") -> dict:
+        """
+        Mass mean probe directions between classes.
+
+        Args:
+            mode (str): "pairwise" for every pair (a, b) of classes with a < b, or
+                "one_vs_rest" for every class c against all other samples.
+
+        Returns:
+            dict: Dictionary mapping (a, b) resp. c to a tuple
+                (probe, mean_activation_other, mean_activation_class), with the
+                same meaning as the outputs of ``compute_mass_mean_probe`` where b
+                resp. c plays the role of the artifact class.
+        """
+        order = sorted(range(len(self.classes)), key=lambda i: self.classes[i])
+        means = self.sums / self.counts[:, None]
+
+        probes = {}
+        match mode:
+            case "pairwise":
+                for k, a in enumerate(order):
+                    for b in order[k + 1 :]:
+                        key = (self.classes[a], self.classes[b])
+                        probes[key] = (means[b] - means[a], means[a], means[b])
+            case "one_vs_rest":
+                total_sum, total_count = self.sums.sum(0), self.counts.sum()
+                for c in order:
+                    rest = (total_sum - self.sums[c]) / (total_count - self.counts[c])
+                    probes[self.classes[c]] = (means[c] - rest, rest, means[c])
+            case _:
+                raise ValueError(f"Unknown probe mode '{mode}'")
+
+        return {
+            key: tuple(t.float().cpu() for t in values) for key, values in probes.items()
+        }
+
+    @classmethod
+    def from_activations(
+        cls,
+        activations,
+        layer: str,
+        groups: np.ndarray,
+        batch_size: int = 4096,
+        device: str = "cpu",
+    ) -> "StreamingMassMeanProbe":
+        """
+        Accumulate class means over a stored layer, reading ``batch_size`` rows at a time.
+        """
+        probe = cls(device)
+        accumulate_from_activations(activations, layer, groups, probe.update, batch_size)
+        return probe
+
+    @classmethod
+    def from_dataloader(
+        cls,
+        model: torch.nn.Module,
+        dataloader: torch.utils.data.DataLoader,
+        layer: str,
+        device: str = "cuda",
+        label_column: int = 1,
+        reducer=None,
+    ) -> "StreamingMassMeanProbe":
+        """
+        Accumulate class means straight from a forward hook, without storing activations.
+        ``label_column`` selects the label column holding the classes or groups.
+        """
+        probe = cls(device)
+        accumulate_from_dataloader(
+            model,
+            dataloader,
+            layer,
+            probe.update,
+            device,
+            label_column,
+            reducer,
+            desc="Accumulating class means",
+        )
+        return probe
+
 
 def compute_mass_mean_probe(
     vecs: np.ndarray, targets: np.ndarray
@@ -18,24 +164,15 @@ def compute_mass_mean_probe(
             - mean_activation_over_nonartifact_samples (torch.Tensor): The mean activation over non-artifact samples.
             - mean_activation_over_artifact_samples (torch.Tensor): The mean activation over artifact samples
     """
-    X = vecs
-
-    mean_activation_over_artifact_samples = X[targets == 1].mean(0)
-    mean_activation_over_nonartifact_samples = X[targets == 0].mean(0)
-
-    mass_mean_probe = (
-        mean_activation_over_artifact_samples - mean_activation_over_nonartifact_samples
-    )
-    mass_mean_probe = torch.tensor(mass_mean_probe, dtype=torch.float32)
-    mean_activation_over_nonartifact_samples = torch.tensor(
-        mean_activation_over_nonartifact_samples, dtype=torch.float32
-    )
-    mean_activation_over_artifact_samples = torch.tensor(
-        mean_activation_over_artifact_samples, dtype=torch.float32
-    )
-
-    return (
-        mass_mean_probe,
-        mean_activation_over_nonartifact_samples,
-        mean_activation_over_artifact_samples,
-    )
+    # Accumulate in blocks instead of copying both halves of the matrix. Labels other
+    # than 0 and 1 form classes of their own and are left out of the probe.
+    probe = StreamingMassMeanProbe.from_activations({"vecs": vecs}, "vecs", targets)
+    means = probe.means()
+
+    # As with the mean of an empty subset, a missing class yields NaN. The means are
+    # accumulated flattened and returned in the shape of a sample.
+    shape = tuple(vecs.shape[1:])
+    nan = torch.full(shape, np.nan, dtype=torch.float64)
+    mean_nonartifact = means.get(0, nan).reshape(shape).float().cpu()
+    mean_artifact = means.get(1, nan).reshape(shape).float().cpu()
+    return mean_artifact - mean_nonartifact, mean_nonartifact, mean_artifact
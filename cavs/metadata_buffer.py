@@ -0,0 +1,108 @@
+import numpy as np
+import torch
+
+
+class MetadataBuffer:
+    """
+    Columnar, amortised-growth store for the non-input fields of each batch.
+
+    Every extra batch field (labels, protected attribute, sample ids, ...) gets its own
+    column that keeps the field's native dtype. Columns are preallocated and doubled
+    when full, so appending is amortised O(batch_size) instead of re-concatenating
+    everything collected so far.
+
+    Args:
+        capacity (int): Initial number of rows to preallocate.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.capacity = max(int(capacity), 1)
+        self.columns = None
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @staticmethod
+    def _to_numpy(field, batch_size: int) -> np.ndarray:
+        if isinstance(field, torch.Tensor):
+            field = field.detach().cpu().numpy()
+        else:
+            field = np.asarray(field)
+        return field.reshape(batch_size, -1) if field.ndim > 1 else field.reshape(-1)
+
+    def _grow(self, min_capacity: int) -> None:
+        while self.capacity < min_capacity:
+            self.capacity *= 2
+        for i, column in enumerate(self.columns):
+            grown = np.empty((self.capacity, *column.shape[1:]), dtype=column.dtype)
+            grown[: self.size] = column[: self.size]
+            self.columns[i] = grown
+
+    def append(self, fields: tuple | list, batch_size: int) -> None:
+        """
+        Append the extra fields of one batch.
+
+        Args:
+            fields (tuple or list): Batch fields after the input, each with batch_size rows.
+            batch_size (int): Number of samples in the batch.
+        """
+        arrays = [self._to_numpy(field, batch_size) for field in fields]
+
+        if self.columns is None:
+            self.columns = [
+                np.empty((self.capacity, *array.shape[1:]), dtype=array.dtype)
+                for array in arrays
+            ]
+        elif len(arrays) != len(self.columns):
+            raise ValueError(
+                f"Expected {len(self.columns)} extra batch fields, got {len(arrays)}"
+            )
+
+        if self.size + batch_size > self.capacity:
+            self._grow(self.size + batch_size)
+
+        for i, array in enumerate(arrays):
+            column = self.columns[i]
+            dtype = np.result_type(column.dtype, array.dtype)
+            if dtype != column.dtype:
+                # e.g. a longer sample id string than seen so far
+                column = column.astype(dtype)
+                self.columns[i] = column
+            column[self.size : self.size + batch_size] = array
+
+        self.size += batch_size
+
+    def to_dict(self, prefix: str = "labels") -> dict:
+        """
+        Export the collected metadata.
+
+        Returns:
+            dict: ``prefix`` maps to the numeric scalar columns stacked into an
+                  (n_samples, n_fields) array in their common dtype, as consumed by
+                  ``CLARC`` and ``LEACE``. Column i of the array is field i, so other
+                  fields (strings, multi-dimensional) before the last numeric scalar
+                  one are kept as NaN placeholder columns; trailing ones are dropped.
+                  ``f"{prefix}_{i}"`` maps to column i in its native dtype.
+        """
+        columns = [column[: self.size] for column in self.columns or []]
+        metadata = {f"{prefix}_{i}": column for i, column in enumerate(columns)}
+
+        is_scalar = [
+            column.ndim == 1 and column.dtype.kind in "biuf" for column in columns
+        ]
+        num_fields = max(
+            (i + 1 for i, scalar in enumerate(is_scalar) if scalar), default=0
+        )
+        if num_fields > 0:
+            metadata[prefix] = np.stack(
+                [
+                    column if scalar else np.full(self.size, np.nan)
+                    for column, scalar in zip(columns[:num_fields], is_scalar)
+                ],
+                axis=1,
+            )
+        else:
+            metadata[prefix] = np.empty((self.size, 0))
+
+        return metadata
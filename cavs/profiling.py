@@ -0,0 +1,193 @@
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_active_profiler = None
+
+
+def _peak_rss_bytes() -> int | None:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _cuda_peak_bytes() -> int | None:
+    if not torch.cuda.is_available() or not torch.cuda.is_initialized():
+        return None
+    return torch.cuda.max_memory_allocated()
+
+
+def _describe(value):
+    # Tensors and arrays are recorded by shape, dtype and size instead of by value
+    if isinstance(value, torch.Tensor):
+        nbytes = value.numel() * value.element_size()
+    elif isinstance(value, np.ndarray):
+        nbytes = value.nbytes
+    else:
+        return value
+    return {"shape": tuple(value.shape), "dtype": str(value.dtype), "bytes": nbytes}
+
+
+class Span:
+    """
+    A named, timed region. Attributes such as tensors can be attached with ``set``;
+    tensors and arrays are recorded by shape, dtype and bytes.
+    """
+
+    def __init__(self, name: str, attrs: dict) -> None:
+        self.name = name
+        self.attrs = {}
+        self.set(**attrs)
+
+    def set(self, **attrs) -> None:
+        self.attrs.update({key: _describe(value) for key, value in attrs.items()})
+
+
+class _NullSpan:
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Profiler:
+    """
+    Collects spans of the CAV and model correction pipeline.
+
+    Every span records its wall and CPU time, the peak resident set size and peak CUDA
+    memory allocated (when CUDA is in use) of the process at its end, and any
+    attributes passed to ``span`` or ``Span.set``, with tensors recorded by shape,
+    dtype and bytes. Spans are also logged at DEBUG level to the ``cavs.profiling``
+    logger. Use it as a context manager to enable it, and export the spans with
+    ``to_json`` or ``to_chrome_trace`` (viewable in chrome://tracing or Perfetto).
+    """
+
+    def __init__(self) -> None:
+        self.spans = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._previous = None
+
+    def __enter__(self) -> "Profiler":
+        global _active_profiler
+        self._previous, _active_profiler = _active_profiler, self
+        return self
+
+    def __exit__(self, *exc) -> None:
+        global _active_profiler
+        _active_profiler = self._previous
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        span = Span(name, attrs)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield span
+        finally:
+            record = {
+                "name": name,
+                "start": start - self._origin,
+                "wall": time.perf_counter() - start,
+                "cpu": time.process_time() - cpu_start,
+                "peak_rss_bytes": _peak_rss_bytes(),
+                "cuda_peak_bytes": _cuda_peak_bytes(),
+                "thread": threading.get_ident(),
+                **span.attrs,
+            }
+            with self._lock:
+                self.spans.append(record)
+            logger.debug(
+                "%s: wall %.4fs, cpu %.4fs %s",
+                name,
+                record["wall"],
+                record["cpu"],
+                span.attrs or "",
+            )
+
+    def summary(self) -> dict:
+        """
+        Total wall and CPU time, and number of calls, per span name.
+        """
+        totals = {}
+        for record in self.spans:
+            total = totals.setdefault(record["name"], {"calls": 0, "wall": 0.0, "cpu": 0.0})
+            total["calls"] += 1
+            total["wall"] += record["wall"]
+            total["cpu"] += record["cpu"]
+        return totals
+
+    def to_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"spans": self.spans, "summary": self.summary()}, f, indent=2)
+
+    def to_chrome_trace(self, path: str) -> None:
+        events = [
+            {
+                "name": record["name"],
+                "ph": "X",
+                "ts": record["start"] * 1e6,
+                "dur": record["wall"] * 1e6,
+                "pid": os.getpid(),
+                "tid": record["thread"],
+                "args": {
+                    k: v
+                    for k, v in record.items()
+                    if k not in ("name", "start", "wall", "thread")
+                },
+            }
+            for record in self.spans
+        ]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=repr)
+
+
+def span(name: str, **attrs):
+    """
+    Time a region under the active profiler.
+
+    Without an active ``Profiler`` this returns a shared no-op context, so
+    instrumented code costs a function call and a global lookup.
+
+    Args:
+        name (str): Span name, e.g. "cavs.compute_cav".
+        **attrs: Attributes recorded with the span. Tensors and arrays are recorded
+            by shape, dtype and bytes (``numel() * element_size()``).
+
+    Returns:
+        Context manager yielding a ``Span`` (or a no-op stand-in).
+    """
+    if _active_profiler is None:
+        return contextlib.nullcontext(_NULL_SPAN)
+    return _active_profiler.span(name, **attrs)
+
+
+def profiled(name: str):
+    """
+    Decorator recording every call of a function as a span.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapped
+
+    return decorator
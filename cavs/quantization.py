@@ -0,0 +1,161 @@
+import numpy as np
+import torch
+
+# Suffixes of the auxiliary arrays stored next to an int8-quantized layer
+SCALE_SUFFIX = "__scale"
+OFFSET_SUFFIX = "__offset"
+
+STORAGE_DTYPES = ("float16", "bfloat16", "int8")
+
+
+def _groups(x: torch.Tensor) -> torch.Tensor:
+    # (N, C, *spatial) -> (N, C, M): one affine scale per sample and channel.
+    # (N, features) -> (N, 1, features): one affine scale per sample.
+    if x.ndim > 2:
+        return x.flatten(start_dim=2)
+    return x.reshape(len(x), 1, -1)
+
+
+def quantize(x: torch.Tensor, storage_dtype: str) -> tuple[dict, torch.Tensor]:
+    """
+    Convert a batch of activations to a reduced-precision storage format.
+
+    int8 uses an affine map per sample and channel (per sample for flat layers), so
+    batches can be quantized independently while streaming.
+
+    Args:
+        x (torch.Tensor): Batch of activations of shape (N, ...).
+        storage_dtype (str): One of "float16", "bfloat16" or "int8".
+
+    Returns:
+        tuple: A tuple containing
+            - stored (dict): Arrays to store, keyed by suffix ("" for the values).
+            - squared_error (torch.Tensor): Summed squared reconstruction error.
+    """
+    x = x.float()
+    match storage_dtype:
+        case "float16":
+            q = x.half()
+            stored = {"": q}
+            recon = q.float()
+        case "bfloat16":
+            q = x.bfloat16()
+            # NumPy has no bfloat16, store the raw bits
+            stored = {"": q.view(torch.int16)}
+            recon = q.float()
+        case "int8":
+            flat = _groups(x)
+            lo = flat.amin(-1, keepdim=True)
+            scale = (flat.amax(-1, keepdim=True) - lo).clamp_min(1e-12) / 255
+            q = (torch.round((flat - lo) / scale) - 128).to(torch.int8)
+            stored = {
+                "": q.reshape(x.shape),
+                SCALE_SUFFIX: scale.squeeze(-1),
+                OFFSET_SUFFIX: lo.squeeze(-1),
+            }
+            recon = ((q.float() + 128) * scale + lo).reshape(x.shape)
+        case _:
+            raise ValueError(
+                f"Unknown storage dtype '{storage_dtype}'. Use one of {STORAGE_DTYPES}."
+            )
+    return stored, ((x - recon) ** 2).sum()
+
+
+def dequantize(
+    values: np.ndarray,
+    storage_dtype: str,
+    scale: np.ndarray | None = None,
+    offset: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Restore float32 activations from their stored representation.
+
+    Args:
+        values (np.ndarray): Stored values.
+        storage_dtype (str): Storage dtype used by ``quantize``.
+        scale (np.ndarray, optional): int8 scales.
+        offset (np.ndarray, optional): int8 offsets.
+
+    Returns:
+        np.ndarray: float32 activations.
+    """
+    match storage_dtype:
+        case "float16":
+            return np.asarray(values, dtype=np.float32)
+        case "bfloat16":
+            bits = np.asarray(values).view(np.uint16).astype(np.uint32) << 16
+            return bits.view(np.float32)
+        case "int8":
+            n = len(values)
+            groups = scale.shape[1] if scale.ndim > 1 else 1
+            size = int(np.prod(values.shape[1:])) // groups
+            flat = values.reshape(n, groups, size).astype(np.float32) + 128
+            flat = flat * scale.reshape(n, groups, 1) + offset.reshape(n, groups, 1)
+            return flat.reshape(values.shape)
+        case _:
+            raise ValueError(f"Unknown storage dtype '{storage_dtype}'")
+
+
+class QuantizationReport:
+    """
+    Accumulates the relative reconstruction error ||x - x_hat||^2 / ||x||^2 per layer.
+    """
+
+    def __init__(self, storage_dtype: str) -> None:
+        if storage_dtype not in STORAGE_DTYPES:
+            raise ValueError(
+                f"Unknown storage dtype '{storage_dtype}'. Use one of {STORAGE_DTYPES}."
+            )
+        self.storage_dtype = storage_dtype
+        self._error = {}
+        self._norm = {}
+
+    def quantize(self, name: str, x: torch.Tensor) -> dict:
+        """
+        Quantize a batch and record its reconstruction error under ``name``.
+        """
+        stored, squared_error = quantize(x, self.storage_dtype)
+        self._error[name] = self._error.get(name, 0.0) + squared_error
+        self._norm[name] = self._norm.get(name, 0.0) + (x.float() ** 2).sum()
+        return stored
+
+    def relative_errors(self) -> dict:
+        return {
+            name: float(self._error[name] / max(float(self._norm[name]), 1e-30))
+            for name in self._error
+        }
+
+    def manifest(self) -> dict:
+        """
+        Per-layer storage dtype and relative reconstruction error.
+        """
+        return {
+            name: {"dtype": self.storage_dtype, "relative_error": error}
+            for name, error in self.relative_errors().items()
+        }
+
+    def state(self) -> dict:
+        """
+        JSON-serialisable accumulated errors, e.g. for an extraction checkpoint.
+        """
+        return {
+            "error": {name: float(value) for name, value in self._error.items()},
+            "norm": {name: float(value) for name, value in self._norm.items()},
+        }
+
+    def load_state(self, state: dict) -> None:
+        """
+        Continue accumulating from a ``state`` of an earlier run.
+        """
+        self._error = dict(state["error"])
+        self._norm = dict(state["norm"])
+
+    def summary(self) -> str:
+        errors = self.relative_errors()
+        worst = max(errors, key=errors.get) if errors else None
+        if worst is None:
+            return f"Stored activations as {self.storage_dtype}"
+        return (
+            f"Stored activations as {self.storage_dtype}, largest relative "
+            f"reconstruction error {errors[worst]:.2e} in layer '{worst}'"
+        )
@@ -0,0 +1,136 @@
+from functools import partial
+from typing import Callable
+
+import torch
+
+# Reducers operate on batched layer outputs in channels-first layout, i.e.
+# (batch, channels, *spatial) for conv layers and (batch, features) for dense layers.
+# They run inside the forward hook on the model's device, before the host copy.
+
+
+def global_avg_pool(x: torch.Tensor) -> torch.Tensor:
+    """
+    Average over all spatial dimensions, (N, C, *spatial) -> (N, C).
+    """
+    if x.ndim <= 2:
+        return x
+    return x.mean(dim=tuple(range(2, x.ndim)))
+
+
+def global_max_pool(x: torch.Tensor) -> torch.Tensor:
+    """
+    Maximum over all spatial dimensions, (N, C, *spatial) -> (N, C).
+    """
+    if x.ndim <= 2:
+        return x
+    return x.flatten(start_dim=2).max(2).values
+
+
+def flatten(x: torch.Tensor) -> torch.Tensor:
+    """
+    Flatten all non-batch dimensions, (N, ...) -> (N, features).
+    """
+    return x.flatten(start_dim=1)
+
+
+def _select_channels(x: torch.Tensor, channels: tuple) -> torch.Tensor:
+    index = torch.as_tensor(channels, dtype=torch.long, device=x.device)
+    return x.index_select(1, index)
+
+
+def _crop(x: torch.Tensor, top: int, left: int, height: int, width: int) -> torch.Tensor:
+    return x[..., top : top + height, left : left + width]
+
+
+def _stride(x: torch.Tensor, stride: int) -> torch.Tensor:
+    if x.ndim == 3:
+        return x[..., ::stride]
+    return x[..., ::stride, ::stride]
+
+
+def _compose(x: torch.Tensor, reducers: tuple) -> torch.Tensor:
+    for reducer in reducers:
+        x = reducer(x)
+    return x
+
+
+def channel_subset(channels: list[int]) -> Callable:
+    """
+    Keep only the given channels, (N, C, ...) -> (N, len(channels), ...).
+    """
+    return partial(_select_channels, channels=tuple(channels))
+
+
+def spatial_crop(top: int, left: int, height: int, width: int) -> Callable:
+    """
+    Crop a (height, width) window starting at (top, left) from the last two dimensions.
+    """
+    return partial(_crop, top=top, left=left, height=height, width=width)
+
+
+def spatial_stride(stride: int) -> Callable:
+    """
+    Subsample the spatial dimensions with the given stride.
+    """
+    if stride <= 0:
+        raise ValueError("stride must be a positive integer")
+    return partial(_stride, stride=stride)
+
+
+def compose(*reducers: str | Callable) -> Callable:
+    """
+    Chain several reducers, e.g. ``compose(channel_subset([0, 5]), "gap")``.
+    """
+    return partial(_compose, reducers=tuple(get_reducer(r) for r in reducers))
+
+
+REDUCERS = {
+    "gap": global_avg_pool,
+    "gmp": global_max_pool,
+    "flatten": flatten,
+}
+
+
+def get_reducer(spec: str | Callable | None) -> Callable | None:
+    """
+    Resolve a reducer specification.
+
+    Args:
+        spec (str, callable or None): One of "none", "gap", "gmp", "flatten", a callable
+                                      mapping a batched tensor to a batched tensor, or None.
+
+    Returns:
+        callable or None: The reducer, or None if activations are kept as they are.
+    """
+    if spec is None or spec == "none":
+        return None
+    if callable(spec):
+        return spec
+    if isinstance(spec, str) and spec in REDUCERS:
+        return REDUCERS[spec]
+    raise ValueError(
+        f"Unknown reducer '{spec}'. Use one of {['none', *REDUCERS]} or a callable."
+    )
+
+
+def resolve_reducers(reducers: str | Callable | dict | None, layer_names) -> dict:
+    """
+    Map every layer name to its reducer.
+
+    Args:
+        reducers (str, callable, dict or None): A single reducer applied to every layer,
+                                                or a dict of {layer_name: reducer}.
+                                                Layers missing from the dict are not reduced.
+        layer_names (iterable): Names of the hooked layers.
+
+    Returns:
+        dict: Dictionary mapping layer names to a reducer callable or None.
+    """
+    if isinstance(reducers, dict):
+        unknown = set(reducers) - set(layer_names)
+        if unknown:
+            raise ValueError(f"Reducers given for layers that are not hooked: {unknown}")
+        return {name: get_reducer(reducers.get(name)) for name in layer_names}
+
+    reducer = get_reducer(reducers)
+    return {name: reducer for name in layer_names}
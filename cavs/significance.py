@@ -0,0 +1,69 @@
+import numpy as np
+import torch
+from scipy import stats
+
+from .cav import compute_cavs
+
+
+def tcav_significance(
+    vecs: np.ndarray,
+    targets: np.ndarray,
+    grads: np.ndarray | torch.Tensor,
+    cav_type: str = "ridge",
+    num_random: int = 200,
+    seed: int = 0,
+) -> dict:
+    """
+    Test TCAV scores of a concept against random-concept baselines.
+
+    Random CAVs are fitted on random permutations of the concept labels, which keep the
+    class balance but break the link to the concept. The concept and all random CAVs
+    are fitted in one batched solve with ``compute_cavs``, and scored against the same
+    activation gradients with a single matrix product.
+
+    With a single concept CAV, the p-value is the two-sided permutation p-value of
+    |score - 0.5|. With several concept CAVs (target columns, e.g. one per random set
+    of negatives as in the original TCAV), it is the p-value of a two-sided Welch
+    t-test between the concept and the random scores.
+
+    Args:
+        vecs (np.ndarray): Activations of shape (n_samples, n_features).
+        targets (np.ndarray): Binary concept targets of shape (n_samples,) or
+            (n_samples, n_concept_runs).
+        grads (np.ndarray or torch.Tensor): Activation gradients of shape
+            (n_grad_samples, n_features), e.g. from ``collect_activation_gradients``.
+        cav_type (str): CAV type, see ``compute_cavs``. "ridge", "signal" and "mmp"
+            are fitted in one batched solve.
+        num_random (int): Number of random CAVs.
+        seed (int): Seed of the permutations.
+
+    Returns:
+        dict: Dictionary with
+            - "tcav": TCAV scores of the concept CAVs, shape (n_concept_runs,).
+            - "random_tcav": TCAV scores of the random CAVs, shape (num_random,).
+            - "p_value": p-value of the concept scores against the random scores.
+    """
+    targets = np.asarray(targets)
+    if targets.ndim == 1:
+        targets = targets[:, None]
+    num_concepts = targets.shape[1]
+
+    rng = np.random.default_rng(seed)
+    columns = rng.integers(num_concepts, size=num_random)
+    random_targets = np.stack(
+        [rng.permutation(targets[:, c]) for c in columns], axis=1
+    )
+
+    cavs, _, _ = compute_cavs(vecs, np.concatenate([targets, random_targets], 1), cav_type)
+
+    grads = torch.as_tensor(np.asarray(grads), dtype=torch.float32)
+    scores = ((grads @ cavs.T) > 0).float().mean(0).numpy()
+    tcav, random_tcav = scores[:num_concepts], scores[num_concepts:]
+
+    if num_concepts == 1:
+        distance = np.abs(tcav[0] - 0.5)
+        p_value = (1 + (np.abs(random_tcav - 0.5) >= distance).sum()) / (num_random + 1)
+    else:
+        p_value = stats.ttest_ind(tcav, random_tcav, equal_var=False).pvalue
+
+    return {"tcav": tcav, "random_tcav": random_tcav, "p_value": float(p_value)}
@@ -0,0 +1,241 @@
+import math
+
+import numpy as np
+import torch
+
+
+def _as_float_tensor(x: np.ndarray | torch.Tensor) -> torch.Tensor:
+    if isinstance(x, torch.Tensor):
+        return x.detach().float().cpu()
+    # Copy, since codes may be read-only memmaps
+    return torch.tensor(np.asarray(x), dtype=torch.float32)
+
+
+class Sketch:
+    """
+    Linear sketch of flattened layer activations, codes = (x - mean) @ basis.
+
+    Sketches run inside the extraction hooks on the model's device. ``push`` consumes a
+    batch and returns the code batches that are ready to be written, ``finish`` returns
+    whatever is still buffered at the end of the pass. CAVs fitted on the codes are
+    mapped back to the full activation space with ``lift``.
+
+    Args:
+        k (int): Sketch dimension.
+    """
+
+    name = None
+    # Whether codes only depend on the configuration (and not on the data seen so far),
+    # which is required for resuming and for data-parallel extraction
+    stateless = False
+
+    def __init__(self, k: int) -> None:
+        if k <= 0:
+            raise ValueError("k must be a positive integer")
+        self.k = k
+        self.basis = None
+        self.mean = None
+
+    def config(self) -> dict:
+        return {"type": self.name, "k": self.k}
+
+    def transform(self, x: torch.Tensor) -> torch.Tensor:
+        x = x.flatten(start_dim=1).float()
+        if self.basis.device != x.device:
+            # Keep the basis on the device the activations come from
+            self.basis = self.basis.to(x.device)
+            self.mean = self.mean.to(x.device)
+        return (x - self.mean) @ self.basis
+
+    def push(self, x: torch.Tensor) -> list[torch.Tensor]:
+        raise NotImplementedError
+
+    def finish(self) -> list[torch.Tensor]:
+        return []
+
+    def state(self) -> dict:
+        """
+        Fitted basis (n_features, k) and mean (n_features,) as NumPy arrays.
+        """
+        return {
+            "basis": self.basis.detach().cpu().numpy(),
+            "mean": self.mean.detach().cpu().numpy(),
+        }
+
+    def lift(self, w: np.ndarray | torch.Tensor) -> torch.Tensor:
+        """
+        Map a direction in code space to the full activation space.
+
+        For a linear score w . z on the codes, the equivalent full-space direction is
+        basis @ w, since w . ((x - mean) @ basis) = (basis @ w) . (x - mean).
+
+        Args:
+            w (np.ndarray or torch.Tensor): Direction(s) of shape (k,) or (n, k).
+
+        Returns:
+            torch.Tensor: Direction(s) of shape (n_features,) or (n, n_features).
+        """
+        w = _as_float_tensor(w)
+        return w @ self.basis.cpu().T
+
+    def inverse_transform(self, z: np.ndarray | torch.Tensor) -> torch.Tensor:
+        """
+        Least-norm reconstruction of activations from codes, e.g. for mean activations.
+
+        Args:
+            z (np.ndarray or torch.Tensor): Codes of shape (k,) or (n, k).
+
+        Returns:
+            torch.Tensor: Activations of shape (n_features,) or (n, n_features).
+        """
+        z = _as_float_tensor(z)
+        basis = self.basis.cpu()
+        return self.mean.cpu() + z @ torch.linalg.pinv(basis)
+
+
+class RandomProjectionSketch(Sketch):
+    """
+    Seeded Gaussian or sparse random projection.
+
+    The projection is generated on the CPU from ``seed`` the first time a batch arrives,
+    so every process and every resumed run uses the same basis. Gaussian entries are
+    drawn from N(0, 1/k). Sparse entries are +-sqrt(s/k) with probability 1/(2s) each
+    and 0 otherwise, with s = sqrt(n_features), and are applied as a sparse matrix.
+
+    Args:
+        k (int): Sketch dimension.
+        kind (str): "gaussian" or "sparse".
+        seed (int): Seed of the projection.
+    """
+
+    name = "random_projection"
+    stateless = True
+
+    def __init__(self, k: int, kind: str = "gaussian", seed: int = 0) -> None:
+        super().__init__(k)
+        if kind not in ("gaussian", "sparse"):
+            raise ValueError(f"Unknown random projection kind '{kind}'")
+        self.kind = kind
+        self.seed = seed
+        self._sparse_basis_t = None
+
+    def config(self) -> dict:
+        return {**super().config(), "kind": self.kind, "seed": self.seed}
+
+    def _init_basis(self, n_features: int) -> None:
+        generator = torch.Generator().manual_seed(self.seed)
+        if self.kind == "gaussian":
+            self.basis = torch.randn(n_features, self.k, generator=generator)
+            self.basis /= math.sqrt(self.k)
+        else:
+            s = math.sqrt(n_features)
+            u = torch.rand(n_features, self.k, generator=generator)
+            self.basis = torch.zeros(n_features, self.k)
+            self.basis[u < 1 / (2 * s)] = -math.sqrt(s / self.k)
+            self.basis[u > 1 - 1 / (2 * s)] = math.sqrt(s / self.k)
+        self.mean = torch.zeros(n_features)
+
+    def transform(self, x: torch.Tensor) -> torch.Tensor:
+        x = x.flatten(start_dim=1).float()
+        if self.basis is None:
+            self._init_basis(x.shape[1])
+
+        if self.kind == "gaussian":
+            return super().transform(x)
+
+        if self._sparse_basis_t is None or self._sparse_basis_t.device != x.device:
+            self._sparse_basis_t = self.basis.T.to_sparse().to(x.device)
+        return torch.sparse.mm(self._sparse_basis_t, x.T).T
+
+    def push(self, x: torch.Tensor) -> list[torch.Tensor]:
+        return [self.transform(x)]
+
+
+class StreamingPCASketch(Sketch):
+    """
+    PCA sketch fitted during the extraction pass.
+
+    The first ``fit_samples`` samples are buffered on the device. Once enough samples
+    have arrived (or the pass ends), the top-k principal directions are computed with a
+    randomised low-rank SVD, the buffered samples are emitted as codes and all later
+    batches are projected with the frozen basis. Codes therefore depend on the data
+    seen first, so this sketch cannot be used with checkpoints or several processes.
+
+    Args:
+        k (int): Sketch dimension.
+        fit_samples (int, optional): Number of samples to fit on. Defaults to 4 * k.
+        seed (int): Seed of the randomised SVD.
+    """
+
+    name = "pca"
+
+    def __init__(self, k: int, fit_samples: int | None = None, seed: int = 0) -> None:
+        super().__init__(k)
+        self.fit_samples = fit_samples or 4 * k
+        if self.fit_samples <= k:
+            raise ValueError("fit_samples must be larger than k")
+        self.seed = seed
+        self._buffer = []
+        self._buffered = 0
+        self.explained_variance = None
+
+    def config(self) -> dict:
+        return {**super().config(), "fit_samples": self.fit_samples, "seed": self.seed}
+
+    def _fit(self) -> list[torch.Tensor]:
+        X = torch.cat(self._buffer)
+        self._buffer, self._buffered = [], 0
+
+        self.mean = X.mean(0)
+        q = min(self.k, *X.shape)
+        with torch.random.fork_rng(devices=[X.device] if X.is_cuda else []):
+            torch.manual_seed(self.seed)
+            _, S, V = torch.svd_lowrank(X - self.mean, q=q)
+        self.basis = V[:, :q]
+        self.explained_variance = (S[:q] ** 2 / max(len(X) - 1, 1)).cpu()
+        return [self.transform(X)]
+
+    def push(self, x: torch.Tensor) -> list[torch.Tensor]:
+        if self.basis is not None:
+            return [self.transform(x)]
+
+        self._buffer.append(x.flatten(start_dim=1).float())
+        self._buffered += len(x)
+        if self._buffered >= self.fit_samples:
+            return self._fit()
+        return []
+
+    def finish(self) -> list[torch.Tensor]:
+        if self.basis is None and self._buffer:
+            return self._fit()
+        return []
+
+    def inverse_transform(self, z: np.ndarray | torch.Tensor) -> torch.Tensor:
+        # The basis is orthonormal, so its pseudo-inverse is its transpose
+        z = _as_float_tensor(z)
+        return self.mean.cpu() + z @ self.basis.cpu().T
+
+
+SKETCHES = {
+    RandomProjectionSketch.name: RandomProjectionSketch,
+    StreamingPCASketch.name: StreamingPCASketch,
+}
+
+
+def load_sketch(path: str, config: dict) -> Sketch:
+    """
+    Restore a fitted sketch saved by the streaming extraction.
+
+    Args:
+        path (str): Path to the ``.npz`` file with the sketch state.
+        config (dict): Sketch configuration as returned by ``Sketch.config``.
+
+    Returns:
+        Sketch: The fitted sketch.
+    """
+    config = dict(config)
+    sketch = SKETCHES[config.pop("type")](**config)
+    with np.load(path) as state:
+        sketch.basis = torch.from_numpy(state["basis"])
+        sketch.mean = torch.from_numpy(state["mean"])
+    return sketch
@@ -1,8 +1,18 @@
+import contextlib
+import logging
+
 import numpy as np
 import torch
+from scipy import stats
 from torch import nn
 from tqdm import tqdm
 
+logger = logging.getLogger(__name__)
+
+# "full" backpropagates to the input and all parameters, "truncated" only from the
+# target output to the hooked activation
+GRADIENT_MODES = ("full", "truncated")
+
 
 def prepare_model(model: nn.Module, device: str) -> nn.Module:
     """
@@ -45,8 +55,35 @@ def process_cav(cav: np.ndarray or torch.Tensor, device: str) -> torch.Tensor:
     return cav / cav_norm
 
 
+def process_cavs(cavs: np.ndarray | torch.Tensor, device: str) -> torch.Tensor:
+    """
+    Convert one CAV or a stack of CAVs to normalised rows on the specified device.
+
+    Args:
+        cavs (np.ndarray or torch.Tensor): CAV of shape (n_features,) or (1, n_features),
+            or a stack of CAVs of shape (n_cavs, n_features).
+        device (str): Device to move the CAVs to ('cuda' or 'cpu').
+
+    Returns:
+        torch.Tensor: Normalised CAVs of shape (n_cavs, n_features).
+    """
+    if isinstance(cavs, np.ndarray):
+        cavs = torch.from_numpy(cavs)
+    elif not isinstance(cavs, torch.Tensor):
+        raise TypeError("CAVs must be a NumPy array or a PyTorch tensor.")
+
+    cavs = cavs.float().to(device)
+    cavs = cavs.reshape(1, -1) if cavs.ndim == 1 else cavs.flatten(start_dim=1)
+
+    cav_norms = torch.norm(cavs, dim=1, keepdim=True)
+    if (cav_norms == 0).any():
+        raise ValueError("CAV has zero norm and cannot be normalized.")
+
+    return cavs / cav_norms
+
+
 def register_activation_hook(
-    model: nn.Module, target_layer: str, activations: dict
+    model: nn.Module, target_layer: str, activations: dict, truncate: bool = False
 ) -> torch.utils.hooks.RemovableHandle:
     """
     Register a forward hook to capture activations from the specified target layer.
@@ -55,6 +92,8 @@ def register_activation_hook(
         model (nn.Module): The PyTorch model.
         target_layer (str): The name of the layer to hook.
         activations (dict): Dictionary to store the activations.
+        truncate (bool): Cut the graph at the layer: the stored activation becomes a
+            leaf that requires grad, so backward passes stop there.
 
     Returns:
         torch.utils.hooks.RemovableHandle: The hook handle for later removal.
@@ -64,9 +103,17 @@ def register_activation_hook(
         output.retain_grad()  # Retain gradients for non-leaf tensors
         activations["activations"] = output
 
+    def truncating_hook(module, input, output):
+        leaf = output.detach().requires_grad_(True)
+        activations["activations"] = leaf
+        # Hand a copy to the next layers, which may modify it in place
+        return leaf.clone()
+
+    hook = truncating_hook if truncate else forward_hook
+
     for name, module in model.named_modules():
         if name == target_layer:
-            return module.register_forward_hook(forward_hook)
+            return module.register_forward_hook(hook)
 
     raise ValueError(f"Layer '{target_layer}' not found in the model.")
 
@@ -103,6 +150,97 @@ def compute_gradients(
     return inputs.grad
 
 
+@contextlib.contextmanager
+def frozen_parameters(model: nn.Module):
+    """
+    Temporarily stop tracking gradients of all parameters of a model.
+    """
+    frozen = [p for p in model.parameters() if p.requires_grad]
+    for p in frozen:
+        p.requires_grad_(False)
+    try:
+        yield model
+    finally:
+        for p in frozen:
+            p.requires_grad_(True)
+
+
+def compute_activation_gradients(
+    model: nn.Module,
+    inputs: torch.Tensor,
+    activations: dict,
+    target_class: int,
+    gradient_mode: str = "truncated",
+) -> torch.Tensor:
+    """
+    Gradients of the target class with respect to the hooked activations.
+
+    In "truncated" mode (hook registered with ``truncate=True``) parameter gradients
+    are disabled and the input is detached, so the layers before the hook build no
+    graph and the backward pass runs from the target output to the hooked activation
+    only. "full" is the original backward pass of ``compute_gradients``. Both seed the
+    gradient of every sample with its own class output.
+
+    Args:
+        model (nn.Module): The PyTorch model.
+        inputs (torch.Tensor): Input tensor batch.
+        activations (dict): Dictionary filled by ``register_activation_hook``.
+        target_class (int): The target class index.
+        gradient_mode (str): "truncated" or "full".
+
+    Returns:
+        torch.Tensor: Gradients with respect to the activations.
+    """
+    if gradient_mode == "full":
+        compute_gradients(model, inputs, target_class)
+        return extract_activation_gradients(activations)
+    if gradient_mode != "truncated":
+        raise ValueError(
+            f"Unknown gradient mode '{gradient_mode}'. Use one of {GRADIENT_MODES}."
+        )
+
+    with frozen_parameters(model):
+        outputs = model(inputs.detach())
+
+    if outputs.ndimension() == 1 or outputs.size(1) <= target_class:
+        raise IndexError(
+            f"Target class {target_class} is out of bounds for the model output."
+        )
+
+    act = activations.get("activations")
+    if act is None:
+        raise ValueError("Activations have not been captured.")
+    if not act.requires_grad:
+        raise ValueError("Register the activation hook with truncate=True.")
+
+    target_output = outputs[:, target_class]
+    (grad,) = torch.autograd.grad(
+        target_output, act, grad_outputs=target_output.detach()
+    )
+    return grad
+
+
+def split_at_layer(model: nn.Module, target_layer: str) -> nn.Module | None:
+    """
+    The part of a model after ``target_layer``, if the model can be split there.
+
+    Only sequential models can be split, at any of their direct children.
+
+    Args:
+        model (nn.Module): The PyTorch model.
+        target_layer (str): Name of a direct child of the model.
+
+    Returns:
+        nn.Module or None: The layers following ``target_layer``, or None.
+    """
+    if not isinstance(model, nn.Sequential):
+        return None
+    names = [name for name, _ in model.named_children()]
+    if target_layer not in names:
+        return None
+    return model[names.index(target_layer) + 1 :]
+
+
 def extract_activation_gradients(activations: dict) -> torch.Tensor:
     """
     Extract gradients from the stored activations.
@@ -145,18 +283,119 @@ def compute_alignment(grad: torch.Tensor, cav: torch.Tensor) -> torch.Tensor:
 
     Args:
         grad (torch.Tensor): Normalized gradients.
-        cav (torch.Tensor): Normalized Concept Activation Vector.
+        cav (torch.Tensor): Normalized Concept Activation Vector of shape (n_features,),
+            or a stack of CAVs of shape (n_cavs, n_features).
 
     Returns:
-        torch.Tensor: Alignment scores.
+        torch.Tensor: Alignment scores of shape (batch_size,), resp.
+            (batch_size, n_cavs) for a stack of CAVs.
     """
     # Ensure that grad and cav have compatible dimensions
-    if grad.size(1) != cav.size(0):
+    if grad.size(1) != cav.size(-1):
         raise ValueError("Dimension mismatch between gradients and CAV.")
 
+    if cav.ndim == 2:
+        # All CAVs in one matrix product
+        return grad @ cav.T
     return torch.sum(grad * cav, dim=1)
 
 
+def tcav_result(
+    tcav_positive: torch.Tensor,
+    tcav_total: int,
+    derivatives: list[torch.Tensor],
+    stacked: bool,
+    return_derivatives: bool,
+) -> tuple:
+    """
+    Assemble the outputs of ``get_tcav_scores`` from per-CAV positive counts and the
+    per-batch directional derivatives.
+    """
+    tcav_score = tcav_positive.double() / max(tcav_total, 1)
+    if derivatives:
+        derivatives = torch.cat(derivatives)
+    else:
+        derivatives = torch.zeros(0, len(tcav_positive))
+    if not stacked:
+        tcav_score, tcav_positive = tcav_score.item(), tcav_positive.item()
+        derivatives = derivatives[:, 0]
+
+    if return_derivatives:
+        return tcav_score, tcav_positive, tcav_total, derivatives
+    return tcav_score, tcav_positive, tcav_total
+
+
+def iter_tcav_batches(
+    model: nn.Module,
+    cavs: torch.Tensor,
+    dataloader: torch.utils.data.DataLoader,
+    target_layer: str,
+    target_class: int,
+    device: str,
+    num_samples: int,
+    gradient_mode: str = "truncated",
+    desc: str = "Computing TCAV Scores",
+):
+    """
+    Yield the flattened activation gradients of every batch and their alignment with
+    the (processed) CAVs, for exactly ``num_samples`` samples.
+
+    The last batch is trimmed to ``num_samples``; batches whose gradients cannot be
+    computed are skipped with a warning. The generator can be closed early, e.g. by a
+    sequential stopping rule, and removes its hook when it is.
+
+    Yields:
+        tuple: (grad of shape (batch_size, n_features), alignment of shape
+            (batch_size, n_cavs)).
+    """
+    # Register activation hook
+    activations = {}
+    hook_handle = register_activation_hook(
+        model, target_layer, activations, truncate=gradient_mode == "truncated"
+    )
+
+    total = 0
+    try:
+        # Iterate through the DataLoader
+        for batch in tqdm(dataloader, desc=desc):
+            if total >= num_samples:
+                break
+
+            # Handle different batch structures
+            if isinstance(batch, (list, tuple)):
+                inputs, _ = batch[:2]
+            else:
+                inputs = batch  # Assuming batch is just inputs
+
+            inputs = inputs[: num_samples - total].to(device)
+
+            # Compute gradients with respect to the activations
+            try:
+                grad = compute_activation_gradients(
+                    model, inputs, activations, target_class, gradient_mode
+                )
+            except Exception as e:
+                logger.warning("Skipping batch due to error in gradient computation: %s", e)
+                continue
+
+            # Flatten gradients
+            grad = grad.view(grad.size(0), -1)
+
+            # Compute alignment with all CAVs
+            try:
+                alignment = compute_alignment(normalize_tensor(grad), cavs)
+            except Exception as e:
+                logger.warning("Skipping batch due to alignment computation error: %s", e)
+                continue
+
+            total += inputs.size(0)
+            yield grad, alignment
+
+    finally:
+        # Ensure that the hook is removed even if an error occurs
+        hook_handle.remove()
+
+
 def get_tcav_scores(
     model: nn.Module,
     cav: np.ndarray | torch.Tensor,
@@ -165,86 +404,477 @@ def get_tcav_scores(
     target_class: int,
     device: str = "cuda",
     num_samples: int = 100,
-) -> float:
+    return_derivatives: bool = False,
+    gradient_mode: str = "truncated",
+) -> tuple:
     """
     Compute TCAV scores for a given model, CAV, and dataset.
 
+    A stack of CAVs is scored against the same gradients with one matrix product per
+    batch, e.g. a concept CAV together with its random baselines.
+
     Args:
         model (nn.Module): The PyTorch model to analyze.
-        cav (np.ndarray or torch.Tensor): The Concept Activation Vector.
+        cav (np.ndarray or torch.Tensor): The Concept Activation Vector of shape
+            (n_features,) or (1, n_features), or a stack of CAVs of shape
+            (n_cavs, n_features) with n_cavs > 1.
         dataloader (torch.utils.data.DataLoader): DataLoader providing the dataset to evaluate.
         target_layer (str): The name of the layer from which to extract activations.
         target_class (int): The index of the target class for which to compute TCAV scores.
         device (str): Device to perform computations on ('cuda' or 'cpu').
         num_samples (int): Number of samples to use for TCAV computation.
+        return_derivatives (bool): Also return the directional derivatives, i.e. the
+            (unnormalised) activation gradient of every sample projected on the CAVs.
+        gradient_mode (str): "truncated" to backpropagate only to the target layer,
+            or "full", see ``compute_activation_gradients``.
 
     Returns:
-        float: The TCAV score ranging from 0 to 1.
+        tuple: A tuple containing
+            - tcav_score: The TCAV score ranging from 0 to 1, a tensor of shape
+              (n_cavs,) for a stack of CAVs.
+            - tcav_positive: Number of samples with positive alignment, a tensor of
+              shape (n_cavs,) for a stack of CAVs.
+            - tcav_total (int): Number of samples used.
+            - derivatives (torch.Tensor): Only with ``return_derivatives``, directional
+              derivatives of shape (tcav_total,) resp. (tcav_total, n_cavs), on the CPU.
+    """
+    # Prepare model and CAVs
+    model = prepare_model(model, device)
+    cavs = process_cavs(cav, device)
+    stacked = cav.ndim == 2 and cav.shape[0] > 1
+
+    tcav_positive = torch.zeros(len(cavs), dtype=torch.long)
+    tcav_total = 0
+    derivatives = []
+
+    for grad, alignment in iter_tcav_batches(
+        model,
+        cavs,
+        dataloader,
+        target_layer,
+        target_class,
+        device,
+        num_samples,
+        gradient_mode,
+        desc="Computing TCAV Scores",
+    ):
+        if return_derivatives:
+            derivatives.append((grad @ cavs.T).detach().cpu())
+
+        # Count positive alignments
+        tcav_positive += (alignment > 0).sum(0).cpu()
+        tcav_total += grad.size(0)
+
+    # Compute TCAV scores
+    return tcav_result(
+        tcav_positive, tcav_total, derivatives, stacked, return_derivatives
+    )
+
+
+def wilson_interval(
+    positive: np.ndarray | torch.Tensor, total: int, confidence: float = 0.95
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Wilson score interval of a binomial proportion, e.g. a TCAV score.
+
+    Args:
+        positive (np.ndarray or torch.Tensor): Number(s) of positive samples.
+        total (int): Number of samples.
+        confidence (float): Confidence level of the interval.
+
+    Returns:
+        tuple: Lower and upper bounds, with the shape of ``positive``.
+    """
+    positive = np.asarray(positive, dtype=np.float64)
+    if total == 0:
+        return np.zeros_like(positive), np.ones_like(positive)
+
+    z = stats.norm.ppf(0.5 + confidence / 2)
+    p = positive / total
+    center = (p + z**2 / (2 * total)) / (1 + z**2 / total)
+    half_width = (
+        z / (1 + z**2 / total) * np.sqrt(p * (1 - p) / total + z**2 / (4 * total**2))
+    )
+    return center - half_width, center + half_width
+
+
+def get_sequential_tcav_scores(
+    model: nn.Module,
+    cav: np.ndarray | torch.Tensor,
+    dataloader: torch.utils.data.DataLoader,
+    target_layer: str,
+    target_class: int,
+    device: str = "cuda",
+    num_samples: int = 1000,
+    tolerance: float = 0.05,
+    confidence: float = 0.95,
+    min_samples: int = 32,
+    gradient_mode: str = "truncated",
+) -> dict:
+    """
+    Compute TCAV scores with confidence intervals, stopping as soon as they are decided.
+
+    After every batch, the Wilson interval of each CAV's score is updated. A score is
+    decided once its interval is narrower than ``tolerance`` or excludes 0.5, and the
+    pass stops when all scores are decided (after at least ``min_samples`` samples)
+    or ``num_samples`` samples have been used. Checking after every batch makes the
+    interval somewhat optimistic; use a higher ``confidence`` if that matters.
+
+    Args:
+        model (nn.Module): The PyTorch model to analyze.
+        cav (np.ndarray or torch.Tensor): The Concept Activation Vector of shape
+            (n_features,) or (1, n_features), or a stack of CAVs of shape
+            (n_cavs, n_features) with n_cavs > 1.
+        dataloader (torch.utils.data.DataLoader): DataLoader providing the dataset to evaluate.
+        target_layer (str): The name of the layer from which to extract activations.
+        target_class (int): The index of the target class for which to compute TCAV scores.
+        device (str): Device to perform computations on ('cuda' or 'cpu').
+        num_samples (int): Maximum number of samples to use.
+        tolerance (float): Interval width at which a score is decided.
+        confidence (float): Confidence level of the intervals.
+        min_samples (int): Number of samples used before stopping early.
+        gradient_mode (str): "truncated" or "full", see
+            ``compute_activation_gradients``.
+
+    Returns:
+        dict: Dictionary with
+            - "tcav": TCAV score(s).
+            - "positive": Number(s) of samples with positive alignment.
+            - "total" (int): Number of samples used.
+            - "ci_low", "ci_high": Bounds of the confidence interval(s).
+            - "stopped": Per CAV, "tolerance" or "significant" for a decided score,
+              "num_samples" for one still undecided when the samples ran out.
+        Values are floats for a single CAV and arrays of shape (n_cavs,) for a stack.
+    """
+    model = prepare_model(model, device)
+    cavs = process_cavs(cav, device)
+    stacked = cav.ndim == 2 and cav.shape[0] > 1
+
+    positive = np.zeros(len(cavs), dtype=np.int64)
+    total = 0
+    low, high = wilson_interval(positive, total, confidence)
+
+    batches = iter_tcav_batches(
+        model,
+        cavs,
+        dataloader,
+        target_layer,
+        target_class,
+        device,
+        num_samples,
+        gradient_mode,
+        desc="Computing Sequential TCAV Scores",
+    )
+    try:
+        for grad, alignment in batches:
+            positive += (alignment > 0).sum(0).cpu().numpy()
+            total += grad.size(0)
+            low, high = wilson_interval(positive, total, confidence)
+
+            narrow = high - low < tolerance
+            significant = (low > 0.5) | (high < 0.5)
+            if total >= min_samples and (narrow | significant).all():
+                break
+    finally:
+        batches.close()
+
+    # Why each score is final; scores still undecided ran out of samples
+    narrow = high - low < tolerance
+    significant = (low > 0.5) | (high < 0.5)
+    stopped = np.where(
+        narrow, "tolerance", np.where(significant, "significant", "num_samples")
+    )
+
+    logger.debug(
+        "Sequential TCAV stopped after %d samples (%s)", total, stopped.tolist()
+    )
+    result = {
+        "tcav": positive / max(total, 1),
+        "positive": positive,
+        "total": total,
+        "ci_low": low,
+        "ci_high": high,
+        "stopped": stopped,
+    }
+    if not stacked:
+        for key in ("tcav", "positive", "ci_low", "ci_high", "stopped"):
+            result[key] = result[key][0].item()
+    return result
+
+
+def collect_activation_gradients(
+    model: nn.Module,
+    dataloader: torch.utils.data.DataLoader,
+    target_layer: str,
+    target_class: int,
+    device: str = "cuda",
+    num_samples: int = 100,
+    gradient_mode: str = "truncated",
+) -> torch.Tensor:
+    """
+    Collect the flattened, normalised activation gradients that TCAV scores are based on.
+
+    Any number of CAVs can then be scored against the same gradients, see
+    ``cavs.significance.tcav_significance``.
+
+    Args:
+        model (nn.Module): The PyTorch model to analyze.
+        dataloader (torch.utils.data.DataLoader): DataLoader providing the dataset to evaluate.
+        target_layer (str): The name of the layer from which to extract activations.
+        target_class (int): The index of the target class.
+        device (str): Device to perform computations on ('cuda' or 'cpu').
+        num_samples (int): Number of samples to collect gradients for.
+        gradient_mode (str): "truncated" or "full", see
+            ``compute_activation_gradients``.
+
+    Returns:
+        torch.Tensor: Normalised gradients of shape (num_samples, n_features) on the CPU.
     """
-    # Prepare model and CAV
     model = prepare_model(model, device)
-    cav = process_cav(cav, device)
 
-    # Register activation hook
     activations = {}
-    hook_handle = register_activation_hook(model, target_layer, activations)
+    hook_handle = register_activation_hook(
+        model, target_layer, activations, truncate=gradient_mode == "truncated"
+    )
+
+    grads = []
+    total = 0
+    try:
+        for batch in tqdm(dataloader, desc="Collecting Activation Gradients"):
+            if total >= num_samples:
+                break
+
+            inputs = batch[0] if isinstance(batch, (list, tuple)) else batch
+            inputs = inputs[: num_samples - total].to(device)
+
+            grad = compute_activation_gradients(
+                model, inputs, activations, target_class, gradient_mode
+            )
+            grads.append(normalize_tensor(grad.view(grad.size(0), -1)).detach().cpu())
+            total += inputs.size(0)
+    finally:
+        hook_handle.remove()
+
+    return torch.cat(grads)
+
+
+def compute_multiclass_gradients(
+    model: nn.Module,
+    inputs: torch.Tensor,
+    activations: dict,
+    target_classes: list[int],
+    gradient_mode: str = "truncated",
+) -> torch.Tensor:
+    """
+    Gradients of several target classes with respect to the hooked activations, from
+    a single forward pass.
+
+    The backward passes of all classes are batched into one vector-Jacobian product
+    (``is_grads_batched``). As in ``compute_gradients``, the gradient of every sample
+    is seeded with its own class output. Models with operations that cannot be
+    batched fall back to one backward pass per class over the same graph.
+
+    Args:
+        model (nn.Module): The PyTorch model.
+        inputs (torch.Tensor): Input tensor batch.
+        activations (dict): Dictionary filled by ``register_activation_hook``.
+        target_classes (list[int]): Indices of the target classes.
+        gradient_mode (str): "truncated" or "full", see
+            ``compute_activation_gradients``.
+
+    Returns:
+        torch.Tensor: Activation gradients of shape (n_classes, batch_size, ...).
+    """
+    if gradient_mode == "truncated":
+        with frozen_parameters(model):
+            outputs = model(inputs.detach())
+    elif gradient_mode == "full":
+        inputs.requires_grad = True
+        outputs = model(inputs)
+    else:
+        raise ValueError(
+            f"Unknown gradient mode '{gradient_mode}'. Use one of {GRADIENT_MODES}."
+        )
+
+    if outputs.ndimension() == 1 or outputs.size(1) <= max(target_classes):
+        raise IndexError(
+            f"Target classes {target_classes} are out of bounds for the model output."
+        )
+
+    act = activations.get("activations")
+    if act is None:
+        raise ValueError("Activations have not been captured.")
+
+    target_outputs = outputs[:, target_classes]
+    num_classes = len(target_classes)
+    # Row k seeds class k with its outputs and all other classes with zero
+    seeds = torch.diag_embed(target_outputs.detach()).permute(2, 0, 1)
+
+    try:
+        (grads,) = torch.autograd.grad(
+            target_outputs, act, grad_outputs=seeds, is_grads_batched=True
+        )
+    except RuntimeError as e:
+        logger.debug("Batched backward failed, falling back to a loop: %s", e)
+        grads = torch.stack(
+            [
+                torch.autograd.grad(
+                    target_outputs,
+                    act,
+                    grad_outputs=seeds[k],
+                    retain_graph=k < num_classes - 1,
+                )[0]
+                for k in range(num_classes)
+            ]
+        )
+    return grads
 
-    tcav_positive = 0
+
+def get_multiclass_tcav_scores(
+    model: nn.Module,
+    cavs: np.ndarray | torch.Tensor,
+    dataloader: torch.utils.data.DataLoader,
+    target_layer: str,
+    target_classes: list[int],
+    device: str = "cuda",
+    num_samples: int = 100,
+    gradient_mode: str = "truncated",
+) -> tuple[torch.Tensor, torch.Tensor, int]:
+    """
+    Compute TCAV scores for several target classes and CAVs at once.
+
+    Every batch is passed forward once, and the activation gradients of all classes
+    come from one batched backward pass (see ``compute_multiclass_gradients``), so
+    scoring K classes costs about as much as a single ``get_tcav_scores`` run.
+
+    Args:
+        model (nn.Module): The PyTorch model to analyze.
+        cavs (np.ndarray or torch.Tensor): A CAV of shape (n_features,) or a stack of
+            CAVs of shape (n_cavs, n_features).
+        dataloader (torch.utils.data.DataLoader): DataLoader providing the dataset to evaluate.
+        target_layer (str): The name of the layer from which to extract activations.
+        target_classes (list[int]): Indices of the target classes.
+        device (str): Device to perform computations on ('cuda' or 'cpu').
+        num_samples (int): Number of samples to use for TCAV computation.
+        gradient_mode (str): "truncated" or "full", see
+            ``compute_activation_gradients``.
+
+    Returns:
+        tuple: A tuple containing
+            - tcav_scores (torch.Tensor): Scores of shape (n_classes, n_cavs).
+            - tcav_positive (torch.Tensor): Positive counts of shape (n_classes, n_cavs).
+            - tcav_total (int): Number of samples used.
+    """
+    model = prepare_model(model, device)
+    cavs = process_cavs(cavs, device)
+    target_classes = list(target_classes)
+
+    activations = {}
+    hook_handle = register_activation_hook(
+        model, target_layer, activations, truncate=gradient_mode == "truncated"
+    )
+
+    tcav_positive = torch.zeros(len(target_classes), len(cavs), dtype=torch.long)
     tcav_total = 0
 
     try:
-        # Iterate through the DataLoader
-        for batch in tqdm(dataloader, desc="Computing TCAV Scores"):
+        for batch in tqdm(dataloader, desc="Computing Multi-class TCAV Scores"):
             if tcav_total >= num_samples:
                 break
 
-            # Handle different batch structures
-            if isinstance(batch, (list, tuple)):
-                inputs, _ = batch[:2]
-            else:
-                inputs = batch  # Assuming batch is just inputs
+            inputs = batch[0] if isinstance(batch, (list, tuple)) else batch
+            inputs = inputs[: num_samples - tcav_total].to(device)
 
-            inputs = inputs.to(device)
+            grads = compute_multiclass_gradients(
+                model, inputs, activations, target_classes, gradient_mode
+            )
+            # (n_classes, batch_size, n_features) @ (n_features, n_cavs)
+            grads = normalize_tensor(grads.flatten(start_dim=2), dim=2)
+            alignment = grads @ cavs.T
 
-            # Compute gradients with respect to inputs
-            try:
-                _ = compute_gradients(model, inputs, target_class)
-            except Exception as e:
-                print(f"Skipping batch due to error in gradient computation: {e}")
-                continue
+            tcav_positive += (alignment > 0).sum(1).cpu()
+            tcav_total += inputs.size(0)
+    finally:
+        hook_handle.remove()
 
-            # Extract activation gradients
-            try:
-                grad = extract_activation_gradients(activations)
-            except Exception as e:
-                print(
-                    f"Skipping batch due to error in extracting activation gradients: {e}"
-                )
-                continue
+    tcav_scores = tcav_positive.double() / max(tcav_total, 1)
+    return tcav_scores, tcav_positive, tcav_total
 
-            # Flatten gradients and activations
-            grad = grad.view(grad.size(0), -1)
-            act = activations["activations"]
-            act = act.view(act.size(0), -1)
 
-            # Normalize gradients
-            grad = normalize_tensor(grad)
+def get_tcav_scores_from_activations(
+    model: nn.Module,
+    cav: np.ndarray | torch.Tensor,
+    activations: np.ndarray | torch.Tensor,
+    target_layer: str,
+    target_class: int,
+    device: str = "cuda",
+    num_samples: int = 100,
+    batch_size: int = 64,
+    return_derivatives: bool = False,
+) -> tuple:
+    """
+    Compute TCAV scores from stored activations, running only the layers after
+    ``target_layer``.
 
-            # Compute alignment with CAV
-            try:
-                alignment = compute_alignment(grad, cav)
-            except Exception as e:
-                print(f"Skipping batch due to alignment computation error: {e}")
-                continue
+    The model is split with ``split_at_layer``; the stored activations are the
+    leaves of the backward pass, so neither the layers before ``target_layer`` nor
+    any parameter gradients are computed.
 
-            # Count positive alignments
-            tcav_positive += (alignment > 0).sum().item()
-            tcav_total += inputs.size(0)
+    Args:
+        model (nn.Module): The PyTorch model to analyze, which must be splittable at
+            ``target_layer``.
+        cav (np.ndarray or torch.Tensor): The Concept Activation Vector of shape
+            (n_features,) or (1, n_features), or a stack of CAVs of shape
+            (n_cavs, n_features) with n_cavs > 1.
+        activations (np.ndarray or torch.Tensor): Unreduced outputs of ``target_layer``
+            of shape (n_samples, ...), e.g. from ``extract_activations``.
+        target_layer (str): The name of the layer the activations are taken from.
+        target_class (int): The index of the target class for which to compute TCAV scores.
+        device (str): Device to perform computations on ('cuda' or 'cpu').
+        num_samples (int): Number of samples to use for TCAV computation.
+        batch_size (int): Number of activations passed through the model at a time.
+        return_derivatives (bool): Also return the directional derivatives.
 
-    finally:
-        # Ensure that the hook is removed even if an error occurs
-        hook_handle.remove()
+    Returns:
+        tuple: (tcav_score, tcav_positive, tcav_total), plus the directional
+            derivatives with ``return_derivatives``, as in ``get_tcav_scores``.
+    """
+    suffix = split_at_layer(model, target_layer)
+    if suffix is None:
+        raise ValueError(f"The model cannot be split at layer '{target_layer}'.")
 
-    # Compute TCAV score
-    tcav_score = tcav_positive / tcav_total if tcav_total > 0 else 0.0
-    return tcav_score, tcav_positive, tcav_total
+    suffix = prepare_model(suffix, device)
+    cavs = process_cavs(cav, device)
+    stacked = cav.ndim == 2 and cav.shape[0] > 1
+
+    tcav_positive = torch.zeros(len(cavs), dtype=torch.long)
+    tcav_total = 0
+    derivatives = []
+    num_samples = min(num_samples, len(activations))
+    with frozen_parameters(suffix):
+        for start in range(0, num_samples, batch_size):
+            block = activations[start : min(start + batch_size, num_samples)]
+            act = torch.as_tensor(np.asarray(block), dtype=torch.float32, device=device)
+            act.requires_grad_(True)
+
+            outputs = suffix(act)
+            if outputs.ndimension() == 1 or outputs.size(1) <= target_class:
+                raise IndexError(
+                    f"Target class {target_class} is out of bounds for the model "
+                    "output."
+                )
+            target_output = outputs[:, target_class]
+            (grad,) = torch.autograd.grad(
+                target_output, act, grad_outputs=target_output.detach()
+            )
+
+            grad = grad.view(grad.size(0), -1)
+            alignment = compute_alignment(normalize_tensor(grad), cavs)
+            if return_derivatives:
+                derivatives.append((grad @ cavs.T).detach().cpu())
+            tcav_positive += (alignment > 0).sum(0).cpu()
+            tcav_total += grad.size(0)
+
+    return tcav_result(
+        tcav_positive, tcav_total, derivatives, stacked, return_derivatives
+    )
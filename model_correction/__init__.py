@@ -4,5 +4,6 @@ from .aclarc import ACLARC  # noqa
 from .pclarc import PCLARC  # noqa
 from .rrclarc import RRCLARC, RRLossType, RRMaskingPattern  # noqa
 from .model_correction import ModelCorrectionMethod  # noqa
+from .correction_registry import CorrectionRegistry, correction_key  # noqa
 from .leace import LEACE  # noqa
 from .savani import SavaniRP, BiasMetrics, SavaniLWO  # noqa
@@ -3,7 +3,8 @@ import torch
 from torch import nn
 import lightning as L
 
-from ..cavs import extract_activations, compute_mass_mean_probe, compute_cav
+from ..cavs import extract_activations, fit_cav, fit_layer_cavs
+from .correction_registry import CorrectionRegistry, correction_key
 from .helpers import require_activations_and_cav
 from .model_correction import ModelCorrectionMethod
 
@@ -44,17 +45,59 @@ class CLARC(ModelCorrectionMethod, ABC):
             save_dir,
         )
 
-    def compute_cav(self, cav_type: str, cav_layer: str) -> None:
+    def _registry_key(self, cav_type: str, cav_layer: str) -> str:
+        return correction_key(
+            self.model,
+            "CLARC",
+            cav_layer,
+            cav_type=cav_type,
+            experiment_name=self.experiment_name,
+        )
+
+    def load_cav(
+        self, registry: CorrectionRegistry, cav_type: str, cav_layer: str
+    ) -> bool:
+        """
+        Load a CAV and mean activations fitted earlier for the same model, layer,
+        CAV type and experiment, without extracting activations.
+
+        Returns:
+            bool: Whether the registry held a matching entry.
+        """
+        state = registry.load(self._registry_key(cav_type, cav_layer), self.device)
+        if state is None:
+            return False
+
+        self.cav = state["cav"]
+        self.mean_act_na = state["mean_act_na"]
+        self.mean_act_a = state["mean_act_a"]
+        self.cav_type = cav_type
+        self.activations = None
+        return True
+
+    def compute_cav(
+        self,
+        cav_type: str,
+        cav_layer: str,
+        registry: CorrectionRegistry | None = None,
+    ) -> None:
+        if registry is not None and self.load_cav(registry, cav_type, cav_layer):
+            return
+
         labels = self.activations["labels"][:, 1]
         layer_acts = self.activations[cav_layer].reshape(
             self.activations[cav_layer].shape[0], -1
         )
 
-        match cav_type:
-            case "mmp":
-                cav, mean_na, mean_a = compute_mass_mean_probe(layer_acts, labels)
-            case _:
-                cav, mean_na, mean_a = compute_cav(layer_acts, labels, cav_type)
+        cav, mean_na, mean_a = fit_cav(layer_acts, labels, cav_type, self.device)
+
+        # Map CAVs fitted on sketched activations back to the full activation space
+        if cav_layer in getattr(self.activations, "manifest", {}).get("sketches", {}):
+            sketch = self.activations.sketch(cav_layer)
+            cav = sketch.lift(cav)
+            cav = cav / cav.norm()
+            mean_na = sketch.inverse_transform(mean_na)
+            mean_a = sketch.inverse_transform(mean_a)
 
         # Move cav and mean_act to proper torch dtype
         self.cav = cav.float().to(self.device)
@@ -64,8 +107,32 @@ class CLARC(ModelCorrectionMethod, ABC):
         self.mean_act_a = mean_a.float().to(self.device)
         self.cav_type = cav_type
 
+        if registry is not None:
+            registry.save(
+                self._registry_key(cav_type, cav_layer),
+                {
+                    "cav": self.cav,
+                    "mean_act_na": self.mean_act_na,
+                    "mean_act_a": self.mean_act_a,
+                },
+                "CLARC",
+                cav_layer,
+            )
+
         self.activations = None
 
+    def fit_layer_cavs(
+        self, cav_type: str, layers: list[str], num_processes: int = 1
+    ) -> dict:
+        """
+        Fit a CAV on every candidate layer to choose ``cav_layer``, see
+        ``cavs.fit_layer_cavs``. Unlike ``compute_cav``, the activations are kept.
+        """
+        labels = self.activations["labels"][:, 1]
+        return fit_layer_cavs(
+            self.activations, layers, labels, cav_type, num_processes=num_processes
+        )
+
     @abstractmethod
     def apply_model_correction(self, cav_layer: str) -> None:
         raise NotImplementedError
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import time
+
+import torch
+from torch import nn
+
+from ..cavs.activation_cache import describe_callable, model_fingerprint
+
+REGISTRY_INDEX_NAME = "registry.json"
+
+
+def correction_key(model: nn.Module, method: str, layer: str | None, **config) -> str:
+    """
+    Address of a fitted correction: model weights, method, layer and method config.
+
+    Args:
+        model (nn.Module): The uncorrected model.
+        method (str): Name of the correction method, e.g. "PCLARC".
+        layer (str, optional): Layer the correction is applied to.
+        **config: Settings that change the fitted state, e.g. the CAV type or the
+            experiment (and thereby the data) it was fitted on.
+
+    Returns:
+        str: Hex digest identifying the correction state.
+    """
+    description = {
+        "model": model_fingerprint(model),
+        "method": method,
+        "layer": layer,
+        "config": {k: describe_callable(v) for k, v in sorted(config.items())},
+    }
+    return hashlib.sha256(
+        json.dumps(description, sort_keys=True, default=repr).encode()
+    ).hexdigest()
+
+
+class CorrectionRegistry:
+    """
+    On-disk registry of fitted correction state, e.g. CAVs and mean activations of
+    CLARC, LEACE erasers or Savani thresholds and weight deltas.
+
+    Every entry is a dict of tensors saved with ``torch.save`` and loaded with
+    ``weights_only=True``, plus a JSON index describing the entries. Entries are keyed
+    by ``correction_key``, so a corrected model can be restored without a data pass.
+
+    Args:
+        registry_dir (str): Directory holding the entries and the index.
+    """
+
+    def __init__(self, registry_dir: str) -> None:
+        self.registry_dir = registry_dir
+        self.index_path = os.path.join(registry_dir, REGISTRY_INDEX_NAME)
+        os.makedirs(registry_dir, exist_ok=True)
+
+    def _read_index(self) -> dict:
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path) as f:
+            return json.load(f)
+
+    def _write_index(self, index: dict) -> None:
+        # Write atomically so concurrent readers never see a truncated index
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def save(self, key: str, state: dict, method: str, layer: str | None = None) -> None:
+        """
+        Store the state of a fitted correction.
+
+        Args:
+            key (str): Key from ``correction_key``.
+            state (dict): Dictionary mapping names to tensors (or None).
+            method (str): Name of the correction method.
+            layer (str, optional): Layer the correction is applied to.
+        """
+        file_name = f"{method}-{key[:16]}.pt"
+        tensors = {
+            name: value.detach().cpu()
+            for name, value in state.items()
+            if value is not None
+        }
+        tmp_path = os.path.join(self.registry_dir, f"tmp_{file_name}")
+        torch.save(tensors, tmp_path)
+        os.replace(tmp_path, os.path.join(self.registry_dir, file_name))
+
+        index = self._read_index()
+        index[key] = {
+            "path": file_name,
+            "method": method,
+            "layer": layer,
+            "created": time.time(),
+        }
+        self._write_index(index)
+
+    def load(self, key: str, device: str = "cpu") -> dict | None:
+        """
+        Load the state of a fitted correction.
+
+        Args:
+            key (str): Key from ``correction_key``.
+            device (str): Device to load the tensors to.
+
+        Returns:
+            dict or None: Dictionary mapping names to tensors, or None if not registered.
+        """
+        entry = self._read_index().get(key)
+        if entry is None:
+            return None
+        path = os.path.join(self.registry_dir, entry["path"])
+        if not os.path.exists(path):
+            return None
+        return torch.load(path, map_location=device, weights_only=True)
@@ -1,6 +1,8 @@
 import torch
 from torch import nn
 
+from ..cavs.profiling import span
+
 
 def stabilize(x: torch.Tensor, epsilon: float = 1e-8) -> torch.Tensor:
     return x + epsilon
@@ -59,6 +61,10 @@ def clarc_hook(cav: torch.Tensor, mean_length: torch.Tensor, alpha: float):
 
     def hook(module: nn.Module, input: tuple, output: torch.Tensor) -> torch.Tensor:
         nonlocal alpha
+        with span("model_correction.hook", method="CLARC", output=output):
+            return _project_out(output, alpha)
+
+    def _project_out(output: torch.Tensor, alpha: float) -> torch.Tensor:
         device = output.device
         output_shapes = output.shape
 
@@ -1,10 +1,16 @@
+import logging
+
 import torch
 from torch import nn
 from concept_erasure import LeaceEraser
 
 from ..cavs import extract_activations
+from ..cavs.profiling import span
+from .correction_registry import CorrectionRegistry, correction_key
 from .model_correction import ModelCorrectionMethod
 
+logger = logging.getLogger(__name__)
+
 
 class LEACE(ModelCorrectionMethod):
     def __init__(self, model: nn.Module, experiment_name: str, device: str) -> None:
@@ -31,25 +37,57 @@ class LEACE(ModelCorrectionMethod):
             save_dir,
         )
 
-    def apply_model_correction(self, layers: list[str]) -> None:
+    def apply_model_correction(
+        self, layers: list[str], registry: CorrectionRegistry | None = None
+    ) -> None:
         """
         Apply the LEACE eraser to the specified layers of the model.
-        """
-        assert hasattr(self, "activations"), "Activations must be extracted first."
-        assert self.activations is not None, "Activations must be extracted first."
 
+        With a ``registry``, erasers fitted earlier for the same model, layer and
+        experiment are loaded instead of refitted, and new ones are stored.
+        """
         for lay in layers:
+            key = None
+            if registry is not None:
+                key = correction_key(
+                    self.model, "LEACE", lay, experiment_name=self.experiment_name
+                )
+                state = registry.load(key, self.device)
+                if state is not None:
+                    eraser = LeaceEraser(
+                        state["proj_left"], state["proj_right"], state.get("bias")
+                    )
+                    self.add_clarc_hook(eraser, [lay])
+                    continue
+
+            assert hasattr(self, "activations"), "Activations must be extracted first."
+            assert self.activations is not None, "Activations must be extracted first."
+
             labels = self.activations["labels"][:, 1]
             layer_acts = self.activations[lay].reshape(
                 self.activations[lay].shape[0], -1
             )
 
-            X_torch = torch.from_numpy(layer_acts).to(self.device)
-            y_torch = torch.from_numpy(labels).to(self.device)
+            # Activations may be read-only memmaps, so copy instead of sharing memory
+            X_torch = torch.tensor(layer_acts, device=self.device)
+            y_torch = torch.tensor(labels, device=self.device)
+
+            logger.debug("Fitting LEACE eraser on activations %s", tuple(X_torch.shape))
 
-            print(X_torch.shape)
+            with span("model_correction.leace.fit", layer=lay, activations=X_torch):
+                eraser = LeaceEraser.fit(X_torch, y_torch)
 
-            eraser = LeaceEraser.fit(X_torch, y_torch)
+            if registry is not None:
+                registry.save(
+                    key,
+                    {
+                        "proj_left": eraser.proj_left,
+                        "proj_right": eraser.proj_right,
+                        "bias": eraser.bias,
+                    },
+                    "LEACE",
+                    lay,
+                )
 
             self.add_clarc_hook(eraser, [lay])
 
@@ -77,8 +115,8 @@ class LEACE(ModelCorrectionMethod):
                 module: nn.Module, input: tuple, output: torch.Tensor
             ) -> torch.Tensor:
                 nonlocal eraser
-                print(output.shape)
-                output = eraser(output.flatten(start_dim=1)).reshape(output.shape)
+                with span("model_correction.hook", method="LEACE", output=output):
+                    output = eraser(output.flatten(start_dim=1)).reshape(output.shape)
                 return output
 
             return hook
@@ -88,7 +126,7 @@ class LEACE(ModelCorrectionMethod):
                 hook_fn = __leace_hook(eraser)
                 handle = module.register_forward_hook(hook_fn)
                 self.hooks.append(handle)
-                print(f"DEBUG: Added hook to layer: {name}")
+                logger.debug("Added hook to layer: %s", name)
 
     def remove_hooks(self) -> None:
         if hasattr(self, "hooks"):
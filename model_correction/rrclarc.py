@@ -1,3 +1,4 @@
+import logging
 from enum import Enum
 from typing import Callable
 import lightning as L
@@ -7,6 +8,9 @@ import types
 
 from .clarc import CLARC
 
+# Not "logger", which apply_model_correction takes as a parameter
+_logger = logging.getLogger(__name__)
+
 
 # Enum masking patterns
 class RRMaskingPattern(Enum):
@@ -54,7 +58,7 @@ class RRCLARC(CLARC):
                 hook_fn = self.rr_clarc_hook()
                 handle = module.register_forward_hook(hook_fn)
                 self.hooks.append(handle)
-                print(f"DEBUG: Added RR-CLARC hook to layer: {name}")
+                _logger.debug("Added RR-CLARC hook to layer: %s", name)
 
         # Override training_step in lightning model by modified_training_step
         clone_original_training_step = deepcopy(self.lightning_model.training_step)
@@ -14,6 +14,8 @@ from skopt import gbrt_minimize
 from skopt.space import Real
 
 # Project imports
+from ...cavs.profiling import span
+from ..correction_registry import CorrectionRegistry
 from .savani_base import SavaniBase
 from .utils import BiasMetrics, flatten_with_map, unflatten_with_map
 
@@ -42,6 +44,7 @@ class SavaniLWO(SavaniBase):
         neuron_frac: float = 0.1,
         tau_init: float = 0.5,
         options: dict = {},
+        registry: CorrectionRegistry | None = None,
     ) -> None:
         """
         Do layer-wise optimization to find the best weights for each layer and the best threshold tau
@@ -49,6 +52,9 @@ class SavaniLWO(SavaniBase):
         In options you can specify that your model already outputs probabilities, in which case the model will not apply the softmax function
         options = {'outputs_are_logits': False}
 
+        With a ``registry``, a threshold and weight deltas found earlier for the same model
+        and config are applied instead of optimizing again, and new results are stored.
+
         """
         assert (
             0 <= frac_of_batches_to_use <= 1
@@ -63,6 +69,25 @@ class SavaniLWO(SavaniBase):
         self.bias_metric = bias_metric
         self.options = options
 
+        if registry is not None:
+            key = self._registry_key(
+                epsilon=epsilon,
+                bias_metric=bias_metric,
+                frac_of_batches_to_use=frac_of_batches_to_use,
+                n_layers_to_optimize=n_layers_to_optimize,
+                optimizer_maxiter=optimizer_maxiter,
+                thresh_optimizer_maxiter=thresh_optimizer_maxiter,
+                beta=beta,
+                neuron_frac=neuron_frac,
+                tau_init=tau_init,
+                options=options,
+            )
+            if self._load_correction(registry, key):
+                return
+            original_state = {
+                k: v.detach().clone() for k, v in self.model.state_dict().items()
+            }
+
         best_tau = None
         best_model = deepcopy(self.model)
         best_phi = -1
@@ -88,7 +113,7 @@ class SavaniLWO(SavaniBase):
             for i, parameters in enumerate(self.model.parameters()):
                 # We're optimizing the last n_layers_to_optimize layers
                 if i < total_layers - n_layers_to_optimize:
-                    logger.debug(f"Skipping layer {i}")
+                    logger.debug("Skipping layer %s", i)
                     continue
 
                 self.parameters_np = parameters.detach().cpu().numpy()
@@ -106,11 +131,12 @@ class SavaniLWO(SavaniBase):
                     for x in flat_parameters
                 ]
 
-                res = gbrt_minimize(
-                    self.objective_LWO(parameters, tau_init),
-                    space,
-                    n_calls=optimizer_maxiter,
-                )
+                with span("model_correction.savani.layer_search", layer=i, size=n):
+                    res = gbrt_minimize(
+                        self.objective_LWO(parameters, tau_init),
+                        space,
+                        n_calls=optimizer_maxiter,
+                    )
 
                 if -res.fun > best_phi:
                     best_params = res.x
@@ -125,18 +151,21 @@ class SavaniLWO(SavaniBase):
                         )
 
                     # Optimize the threshold tau
-                    res: OptimizeResult = optimize.minimize_scalar(
-                        self.objective_thresh("torch", True),
-                        bounds=(0, 1),
-                        method="bounded",
-                        options={"maxiter": thresh_optimizer_maxiter},
-                    )
+                    with span("model_correction.savani.threshold", layer=i):
+                        res: OptimizeResult = optimize.minimize_scalar(
+                            self.objective_thresh("torch", True),
+                            bounds=(0, 1),
+                            method="bounded",
+                            options={"maxiter": thresh_optimizer_maxiter},
+                        )
 
                     if res.success:
                         tau = res.x
                         _phi = -res.fun
                         bias = self.phi_torch(tau)[1].detach().cpu().numpy()
-                        print(f"tau: {tau:.3f}, phi: {_phi:.3f}, bias: {bias:.3f}")
+                        logger.info(
+                            "tau: %.3f, phi: %.3f, bias: %.3f", tau, _phi, bias
+                        )
 
                         if _phi > best_phi:
                             best_tau = tau
@@ -145,7 +174,7 @@ class SavaniLWO(SavaniBase):
                             best_bias = bias
 
                     else:
-                        print(f"Optimization failed: {res.message}")
+                        logger.warning("Optimization failed: %s", res.message)
 
                 pbar.set_description(
                     f"Layer-wise optimization. Layer {i}. (global phi: {best_phi:.3f}, tau: {best_tau:.3f}, bias: {best_bias:.3f})"
@@ -162,6 +191,9 @@ class SavaniLWO(SavaniBase):
         # Add a hook with the best transformation
         self.apply_hook(best_tau)
 
+        if registry is not None:
+            self._save_correction(registry, key, original_state)
+
     def objective_LWO(self, parameters, tau):
         def objective(new_parameters) -> float:
             nonlocal tau
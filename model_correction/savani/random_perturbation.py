@@ -1,4 +1,5 @@
 import sys
+import logging
 import torch
 import lightning as L
 import torch.nn as nn
@@ -10,9 +11,13 @@ from tqdm import tqdm
 from torch.nn.functional import softmax
 
 # Project imports
+from ...cavs.profiling import span
+from ..correction_registry import CorrectionRegistry
 from .savani_base import SavaniBase
 from .utils import BiasMetrics
 
+logger = logging.getLogger(__name__)
+
 
 class SavaniRP(SavaniBase):
     def __init__(
@@ -32,6 +37,7 @@ class SavaniRP(SavaniBase):
         frac_of_batches_to_use: float = 1.0,
         optimizer_maxiter: int = 10,
         options: dict = {},
+        registry: CorrectionRegistry | None = None,
     ) -> None:
         """
         Apply random weights perturbation to the model, then select threshold 'tau' that maximizes phi
@@ -41,6 +47,9 @@ class SavaniRP(SavaniBase):
 
         To change perturbation parameters, you can pass the mean and std of the Gaussian noise
         options = {'mean': 1.0, 'std': 0.1}
+
+        With a ``registry``, a threshold and weight deltas found earlier for the same model
+        and config are applied instead of optimizing again, and new results are stored.
         """
         assert (
             0 <= frac_of_batches_to_use <= 1
@@ -55,6 +64,21 @@ class SavaniRP(SavaniBase):
         self.options = options
         self.bias_metric = bias_metric
 
+        if registry is not None:
+            key = self._registry_key(
+                epsilon=epsilon,
+                T_iters=T_iters,
+                bias_metric=bias_metric,
+                frac_of_batches_to_use=frac_of_batches_to_use,
+                optimizer_maxiter=optimizer_maxiter,
+                options=options,
+            )
+            if self._load_correction(registry, key):
+                return
+            original_state = {
+                k: v.detach().clone() for k, v in self.model.state_dict().items()
+            }
+
         best_tau = None
         best_model = deepcopy(self.model)
         best_phi = -1
@@ -77,19 +101,20 @@ class SavaniRP(SavaniBase):
                 self._perturb_weights(self.model, **options)
 
                 # Optimize the threshold tau
-                res: OptimizeResult = optimize.minimize_scalar(
-                    self.objective_thresh("np", True),
-                    bounds=(0, 1),
-                    method="bounded",
-                    options={"maxiter": optimizer_maxiter},
-                )
+                with span("model_correction.savani.threshold", iteration=i):
+                    res: OptimizeResult = optimize.minimize_scalar(
+                        self.objective_thresh("np", True),
+                        bounds=(0, 1),
+                        method="bounded",
+                        options={"maxiter": optimizer_maxiter},
+                    )
 
                 if res.success:
                     tau = res.x
                     phi = -res.fun
                     bias = self.phi_np(tau)[1]
 
-                    print(f"tau: {tau:.3f}, phi: {phi:.3f}, bias: {bias:.3f}")
+                    logger.info("tau: %.3f, phi: %.3f, bias: %.3f", tau, phi, bias)
 
                     if phi > best_phi:
                         best_tau = tau
@@ -98,7 +123,7 @@ class SavaniRP(SavaniBase):
                         best_bias = bias
 
                 else:
-                    print(f"Optimization failed: {res.message}")
+                    logger.warning("Optimization failed: %s", res.message)
 
                 pbar.set_description(
                     f"Random Perturbation iterations (phi: {best_phi:.3f}, tau: {best_tau:.3f}, bias: {best_bias:.3f})"
@@ -114,6 +139,9 @@ class SavaniRP(SavaniBase):
         # Add a hook with the best transformation
         self.apply_hook(best_tau)
 
+        if registry is not None:
+            self._save_correction(registry, key, original_state)
+
     def _perturb_weights(
         self, module: nn.Module, mean: float = 1.0, std: float = 0.1, **kwargs
     ) -> None:
@@ -1,3 +1,5 @@
+import logging
+
 import numpy as np
 
 import torch
@@ -10,9 +12,12 @@ from torch.nn.functional import softmax, sigmoid
 from abc import ABC, abstractmethod
 
 # Project imports
+from ..correction_registry import CorrectionRegistry, correction_key
 from ..model_correction import ModelCorrectionMethod
 from .utils import phi_torch, phi_np
 
+logger = logging.getLogger(__name__)
+
 
 class SavaniBase(ModelCorrectionMethod, ABC):
     def __init__(
@@ -109,7 +114,6 @@ class SavaniBase(ModelCorrectionMethod, ABC):
             # Assuming binary classification
             output[:, 1] = sigmoid((output[:, 1] - tau) * 10)  # soft thresholding
             output[:, 0] = 1 - output[:, 1]
-            print(f"Hook applied, threshold: {tau}")
             return output
 
         hook_fn = hook
@@ -119,11 +123,53 @@ class SavaniBase(ModelCorrectionMethod, ABC):
         for name, module in self.model.named_modules():
             if isinstance(module, nn.Linear) and name == self.last_layer_name:
                 handle = module.register_forward_hook(hook_fn)
-                print(f"Hook registered on layer: {name}")
+                logger.debug("Hook registered on layer: %s", name)
                 hooks.append(handle)
 
         self.hooks = hooks
 
+    def _registry_key(self, **config) -> str:
+        # Keyed on the model before correction
+        return correction_key(
+            self.model,
+            type(self).__name__,
+            self.last_layer_name,
+            experiment_name=self.experiment_name,
+            **config,
+        )
+
+    def _load_correction(self, registry: CorrectionRegistry, key: str) -> bool:
+        """
+        Apply a threshold and weight deltas found earlier for the same model and config.
+        """
+        state = registry.load(key, self.device)
+        if state is None:
+            return False
+
+        with torch.no_grad():
+            for name, tensor in self.model.state_dict().items():
+                delta = state.get(f"delta.{name}")
+                if delta is not None:
+                    tensor += delta
+
+        self.best_tau = state["tau"].item()
+        self.apply_hook(self.best_tau)
+        return True
+
+    def _save_correction(
+        self, registry: CorrectionRegistry, key: str, original_state: dict
+    ) -> None:
+        """
+        Store the best threshold and the weight deltas w.r.t. ``original_state``.
+        Tensors the correction did not change are left out.
+        """
+        state = {"tau": torch.tensor(self.best_tau)}
+        for name, tensor in self.model.state_dict().items():
+            delta = tensor - original_state[name].to(tensor.device)
+            if delta.any():
+                state[f"delta.{name}"] = delta
+        registry.save(key, state, type(self).__name__, self.last_layer_name)
+
     def check_layer_name_exists(self, layer_name: str) -> bool:
         for name, _ in self.model.named_modules():
             if name == layer_name: